@@ -81,10 +81,13 @@
 
 
 import json
+from datetime import datetime
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from .models import (
     ChatSession, ChatMessage, FacultyDocument,
-    UserProfile, Subject, Section, Timetable, StudentSubjectEnrollment
+    UserProfile, Subject, Section, Timetable, StudentSubjectEnrollment,
+    IngestJob
 )
 
 
@@ -283,6 +286,15 @@ def update_chat_title(db: Session, session_id: int, title: str):
         db.commit()
 
 
+def replace_chat_title(db: Session, session_id: int, old_title: str, new_title: str) -> bool:
+    """Set the title only if it is still old_title (e.g. not renamed meanwhile)."""
+    updated = db.query(ChatSession).filter(
+        ChatSession.id == session_id, ChatSession.title == old_title
+    ).update({ChatSession.title: new_title}, synchronize_session=False)
+    db.commit()
+    return updated > 0
+
+
 def rename_session(db: Session, session_id: int, title: str):
     session = db.query(ChatSession).get(session_id)
     if not session:
@@ -294,15 +306,37 @@ def rename_session(db: Session, session_id: int, title: str):
 
 
 def delete_session(db: Session, session_id: int):
-    session = db.query(ChatSession).get(session_id)
-    if not session:
+    """
+    Delete a session and its messages with two bulk DELETEs (the ORM
+    cascade would load every message first), messages first so no row
+    ever references a missing session.
+    """
+    db.query(ChatMessage).filter(
+        ChatMessage.session_id == session_id
+    ).delete(synchronize_session=False)
+    deleted = (
+        db.query(ChatSession)
+        .filter(ChatSession.id == session_id)
+        .delete(synchronize_session=False)
+    )
+    if not deleted:
+        db.rollback()
         return False
-
-    db.delete(session)
     db.commit()
     return True
 
 
+def get_session_activity(db: Session) -> dict:
+    """{session_id: time of its latest message (or creation)} for every session."""
+    rows = (
+        db.query(ChatSession.id, ChatSession.created_at, func.max(ChatMessage.created_at))
+        .outerjoin(ChatMessage, ChatMessage.session_id == ChatSession.id)
+        .group_by(ChatSession.id)
+        .all()
+    )
+    return {session_id: last or created for session_id, created, last in rows}
+
+
 def toggle_pin_session(db: Session, session_id: int):
     session = db.query(ChatSession).get(session_id)
     if not session:
@@ -515,6 +549,12 @@ def get_faculty_document_by_id(db: Session, doc_id: int):
     return db.query(FacultyDocument).get(doc_id)
 
 
+def get_faculty_file_paths(db: Session):
+    """Saved file path of every faculty document (folders excluded)."""
+    rows = db.query(FacultyDocument.file_path).filter(FacultyDocument.file_path != "__FOLDER__")
+    return [file_path for (file_path,) in rows]
+
+
 def rename_faculty_item(db: Session, item_id: int, new_name: str):
     item = db.query(FacultyDocument).get(item_id)
     if not item:
@@ -537,7 +577,8 @@ def toggle_pin_faculty_item(db: Session, item_id: int):
 
 def delete_faculty_item(db: Session, path: str):
     """
-    Delete faculty item by logical path (works for both files and folders)
+    Delete faculty item by logical path (works for both files and folders).
+    Returns (id, file_path) of each deleted file, so its vectors can be removed.
     """
     # Delete all items that match or start with this path
     items = (
@@ -550,13 +591,14 @@ def delete_faculty_item(db: Session, path: str):
     )
     
     if not items:
-        return False
-    
+        return []
+
+    deleted = [(item.id, item.file_path) for item in items if item.file_path != "__FOLDER__"]
     for item in items:
         db.delete(item)
 
     db.commit()
-    return True
+    return deleted
 
 
 # ============================================================
@@ -606,3 +648,96 @@ def unenroll_student_from_subject(db: Session, student_uid: str, subject_id: int
         db.commit()
         return True
     return False
+
+
+# ============================================================
+# INGESTION JOB CRUD
+# ============================================================
+
+def create_ingest_job(db: Session, job_id: str, owner_type: str, pdf_path: str,
+                      filename: str, owner_id: str = None, session_id: int = None,
+                      department: str = None, year: int = None, section: str = None,
+                      content_hash: str = None, deduplicated: bool = False,
+                      doc_id: int = None):
+    job = IngestJob(
+        id=job_id, owner_type=owner_type, pdf_path=pdf_path, filename=filename,
+        owner_id=owner_id, session_id=session_id,
+        department=department, year=year, section=section,
+        content_hash=content_hash, deduplicated=deduplicated, doc_id=doc_id
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_ingest_job(db: Session, job_id: str):
+    return db.query(IngestJob).filter(IngestJob.id == job_id).first()
+
+
+def content_hash_seen(db: Session, content_hash: str) -> bool:
+    """True if an earlier upload with this content was (or is being) ingested."""
+    return (
+        db.query(IngestJob.id)
+        .filter(IngestJob.content_hash == content_hash, IngestJob.status != "failed")
+        .first()
+    ) is not None
+
+
+def claim_ingest_job(db: Session, job_id: str, worker_id: str) -> bool:
+    """Atomically move a queued job to running; False if another worker has it."""
+    claimed = (
+        db.query(IngestJob)
+        .filter(IngestJob.id == job_id, IngestJob.status == "queued")
+        .update({"status": "running", "attempts": IngestJob.attempts + 1,
+                 "worker_id": worker_id, "error": None, "updated_at": datetime.utcnow()},
+                synchronize_session=False)
+    )
+    db.commit()
+    return claimed == 1
+
+
+def requeue_ingest_job(db: Session, job_id: str, worker_id: str) -> bool:
+    """
+    Atomically move a job running in `worker_id` back to queued; False if
+    it has finished or been requeued (and maybe claimed) by someone else.
+    """
+    requeued = (
+        db.query(IngestJob)
+        .filter(IngestJob.id == job_id, IngestJob.status == "running",
+                IngestJob.worker_id.is_(None) if worker_id is None
+                else IngestJob.worker_id == worker_id)
+        .update({"status": "queued", "updated_at": datetime.utcnow()},
+                synchronize_session=False)
+    )
+    db.commit()
+    return requeued == 1
+
+
+def update_ingest_job(db: Session, job_id: str, **fields):
+    fields["updated_at"] = datetime.utcnow()
+    db.query(IngestJob).filter(IngestJob.id == job_id).update(
+        fields, synchronize_session=False
+    )
+    db.commit()
+
+
+def get_unfinished_ingest_jobs(db: Session):
+    """Queued and running jobs, oldest first."""
+    return (
+        db.query(IngestJob)
+        .filter(IngestJob.status.in_(("queued", "running")))
+        .order_by(IngestJob.created_at)
+        .all()
+    )
+
+
+def get_active_ingest_session_ids(db: Session) -> set:
+    """Sessions with an upload still being indexed."""
+    rows = (
+        db.query(IngestJob.session_id)
+        .filter(IngestJob.session_id.isnot(None), IngestJob.status.in_(("queued", "running")))
+        .distinct()
+        .all()
+    )
+    return {row[0] for row in rows}
@@ -142,3 +142,41 @@ class Timetable(Base):
     day = Column(String, nullable=False)
     time = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# ============================================================
+# INGESTION JOBS (background PDF indexing)
+# ============================================================
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String, primary_key=True, index=True)  # uuid4 hex
+    owner_type = Column(String, nullable=False)  # "faculty" or "student"
+    owner_id = Column(String, nullable=True)
+    session_id = Column(Integer, nullable=True)
+    pdf_path = Column(String, nullable=False)
+    filename = Column(String, nullable=False)
+    content_hash = Column(String, nullable=True, index=True)  # sha256 of the PDF
+    deduplicated = Column(Boolean, default=False)  # content was already ingested
+    doc_id = Column(Integer, nullable=True)  # FacultyDocument.id of a faculty upload
+    department = Column(String, nullable=True)
+    year = Column(Integer, nullable=True)
+    section = Column(String, nullable=True)
+
+    # queued / running / done / failed
+    status = Column(String, default="queued", index=True)
+    # queued / indexing / attaching / attached / done
+    stage = Column(String, default="queued")
+    worker_id = Column(String, nullable=True)  # process that claimed it (app.ingest_jobs.WORKER_ID)
+    pages_total = Column(Integer, nullable=True)
+    pages_done = Column(Integer, default=0)   # pages committed to the index
+    chunks_done = Column(Integer, default=0)
+    attempts = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(
+        DateTime,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow
+    )
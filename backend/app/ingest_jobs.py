@@ -0,0 +1,280 @@
+"""
+Background PDF ingestion.
+
+Uploads are saved to disk, recorded as an IngestJob row and handed to a
+small local worker pool, so the HTTP request returns straight away with a
+job id. Progress (stage, pages and chunks done) is written to the job row
+after every committed batch.
+
+Uploads are deduplicated by content hash (see app.rag.doc_store): a PDF
+is parsed and embedded once into a shared document store, and every
+upload of it is then attached to its faculty / session index. A crashed
+or restarted ingestion resumes from the document's last committed page
+instead of starting over, and a job that already attached its upload is
+never attached twice.
+
+Each job records the worker process that claimed it (WORKER_ID), so on
+startup every running job whose process is gone is requeued straight away.
+
+Deleting a faculty document removes its chunks from the faculty index
+(remove_faculty_documents); a job still running for it cleans up after
+itself once it has attached.
+"""
+import os
+import socket
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.db.database import SessionLocal
+from app.db import crud
+from app.rag.vector_store import index_path_for
+from app.rag.doc_store import (
+    ingest_document, attach_document, detach_document, is_ready, read_progress
+)
+from app.rag.ingest import clean_source_name
+from app.rag.session_store import thaw
+from app.rag.ocr import file_sha256
+
+
+# -----------------------------
+# Config
+# -----------------------------
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_RETRY_DELAY_SECONDS = int(os.getenv("INGEST_RETRY_DELAY_SECONDS", "10"))
+# A running job claimed on another host, which cannot be checked for
+# liveness, is assumed dead once it has not reported progress for this long.
+INGEST_STALE_SECONDS = int(os.getenv("INGEST_STALE_SECONDS", "900"))
+
+# Recorded on the jobs this process claims: "host:pid:random", so a
+# restarted server reusing the pid can still tell the job is not its own
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS,
+                                           thread_name_prefix="ingest")
+        return _executor
+
+
+# -----------------------------
+# Public API
+# -----------------------------
+def submit_ingest_job(pdf_path: str, filename: str, owner_type: str,
+                      owner_id: str = None, session_id: int = None,
+                      department: str = None, year: int = None,
+                      section: str = None, content_hash: str = None,
+                      doc_id: int = None):
+    """
+    Record a job for an uploaded PDF and queue it. `doc_id` is the
+    FacultyDocument id of a faculty upload.
+    Returns (job_id, deduplicated): deduplicated is True when the same
+    content was uploaded before, so its chunks and vectors are reused.
+    """
+    job_id = uuid.uuid4().hex
+    db = SessionLocal()
+    try:
+        deduplicated = content_hash is not None and (
+            is_ready(content_hash) or crud.content_hash_seen(db, content_hash)
+        )
+        crud.create_ingest_job(
+            db, job_id, owner_type=owner_type, pdf_path=pdf_path,
+            filename=filename, owner_id=owner_id, session_id=session_id,
+            department=department, year=year, section=section,
+            content_hash=content_hash, deduplicated=deduplicated, doc_id=doc_id
+        )
+    finally:
+        db.close()
+    _get_executor().submit(_run_job, job_id)
+    return job_id, deduplicated
+
+
+def remove_faculty_documents(docs) -> int:
+    """
+    Remove deleted faculty documents, given as (doc_id, file_path) pairs,
+    from the faculty index. Returns the number of chunks removed.
+
+    Chunks without a doc_id are matched like backfill_doc_ids.py does: by
+    the saved file name, and by the original file name only when no other
+    faculty document has it.
+    """
+    db = SessionLocal()
+    try:
+        names = Counter(clean_source_name(p) for p in crud.get_faculty_file_paths(db))
+    finally:
+        db.close()
+    names.update(clean_source_name(file_path) for _, file_path in docs)   # no longer in the DB
+
+    index_path = index_path_for("faculty", None)
+    removed = 0
+    for doc_id, file_path in docs:
+        legacy = [os.path.basename(file_path)]
+        name = clean_source_name(file_path)
+        if name != legacy[0] and names[name] == 1:
+            legacy.append(name)
+        removed += detach_document(index_path, doc_id, legacy_sources=legacy)
+    return removed
+
+
+def job_status(job) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "stage": job.stage,
+        "filename": job.filename,
+        "session_id": job.session_id,
+        "pages_total": job.pages_total,
+        "pages_done": job.pages_done,
+        "chunks_done": job.chunks_done,
+        "deduplicated": bool(job.deduplicated),
+        "dedup": read_progress(job.content_hash).get("dedup") if job.content_hash else None,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+def resume_ingest_jobs() -> int:
+    """
+    Re-queue jobs left over from a previous run (called on startup): queued
+    jobs, and running jobs whose worker process is gone (or, on another
+    host, has not reported progress for INGEST_STALE_SECONDS).
+    Returns the number of jobs queued.
+    """
+    db = SessionLocal()
+    try:
+        stale_before = datetime.utcnow() - timedelta(seconds=INGEST_STALE_SECONDS)
+        job_ids = []
+        for job in crud.get_unfinished_ingest_jobs(db):
+            if job.status == "running":
+                if job.worker_id == WORKER_ID or not (
+                        _worker_gone(job.worker_id) or job.updated_at < stale_before):
+                    continue
+                # Another API worker starting up may have requeued and claimed it first
+                if not crud.requeue_ingest_job(db, job.id, job.worker_id):
+                    continue
+            job_ids.append(job.id)
+    finally:
+        db.close()
+
+    for job_id in job_ids:
+        _get_executor().submit(_run_job, job_id)
+    if job_ids:
+        print(f"🔁 Resuming {len(job_ids)} ingestion job(s)")
+    return len(job_ids)
+
+
+# -----------------------------
+# Worker
+# -----------------------------
+def _worker_gone(worker_id: str) -> bool:
+    """
+    True if the process that claimed a job is known to have exited: it ran
+    on this host and its pid is free or taken by another process (e.g. this
+    restarted server). Processes on other hosts cannot be checked.
+    """
+    if worker_id is None:
+        return True   # claimed before worker ids were recorded
+    host, pid, _ = worker_id.rsplit(":", 2)
+    if host != socket.gethostname():
+        return False
+    if int(pid) == os.getpid():
+        return worker_id != WORKER_ID
+    if os.name == "nt":
+        return False  # os.kill(pid, 0) would send CTRL_C_EVENT there
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass          # alive, owned by another user
+    return False
+
+
+def _run_job(job_id: str):
+    db = SessionLocal()
+    try:
+        # Several API workers may queue the same job on startup; only one runs it
+        if not crud.claim_ingest_job(db, job_id, WORKER_ID):
+            return
+        job = crud.get_ingest_job(db, job_id)
+
+        try:
+            # A retry after the upload was attached must not attach it again
+            if job.stage != "attached":
+                _index_job(db, job)
+
+            if job.doc_id is not None and crud.get_faculty_document_by_id(db, job.doc_id) is None:
+                # Deleted while we were indexing it
+                remove_faculty_documents([(job.doc_id, job.pdf_path)])
+        except Exception as e:
+            db.rollback()
+            retry = job.attempts < INGEST_MAX_ATTEMPTS
+            crud.update_ingest_job(db, job_id, status="queued" if retry else "failed",
+                                   error=str(e))
+            print(f"⚠️ Ingestion job {job_id} failed (attempt {job.attempts}): {e}")
+            if retry:
+                timer = threading.Timer(INGEST_RETRY_DELAY_SECONDS * job.attempts,
+                                        lambda: _get_executor().submit(_run_job, job_id))
+                timer.daemon = True
+                timer.start()
+            return
+
+        crud.update_ingest_job(db, job_id, status="done", stage="done")
+        _on_job_done(db, job)
+        print(f"✅ Ingestion job {job_id} done: {job.filename}")
+    finally:
+        db.close()
+
+
+def _index_job(db, job):
+    """Ingest the job's document and attach it to the job's index."""
+    content_hash = job.content_hash or file_sha256(job.pdf_path)
+    crud.update_ingest_job(db, job.id, stage="indexing", content_hash=content_hash)
+
+    def progress(pages_done, pages_total, chunks_added):
+        crud.update_ingest_job(db, job.id, pages_done=pages_done,
+                               pages_total=pages_total, chunks_done=chunks_added)
+
+    # Parse + embed once per distinct document (no-op if already done)
+    doc = ingest_document(job.pdf_path, content_hash, progress=progress)
+
+    crud.update_ingest_job(db, job.id, stage="attaching",
+                           pages_done=doc["pages_done"], pages_total=doc["pages_total"])
+    index_path = index_path_for(job.owner_type, job.session_id)
+    thaw(index_path)   # uploading into an idle session
+    ids = attach_document(
+        content_hash,
+        index_path,
+        pdf_path=job.pdf_path,
+        owner_type=job.owner_type,
+        owner_id=job.owner_id,
+        session_id=job.session_id,
+        department=job.department,
+        year=job.year,
+        section=job.section,
+        doc_id=job.doc_id
+    )
+    crud.update_ingest_job(db, job.id, stage="attached", chunks_done=len(ids))
+
+
+def _on_job_done(db, job):
+    if job.owner_type == "student" and job.session_id is not None:
+        # Persist upload confirmation as a chat message so it appears after reload
+        crud.add_message(
+            db, job.session_id, "ai",
+            f"📄 **{job.filename}** has been uploaded and indexed successfully. "
+            f"You can now ask questions about it, request a summary, or — if this is your resume — "
+            f"ask for interview preparation, likely interview questions, or improvement suggestions."
+        )
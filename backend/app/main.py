@@ -1,18 +1,24 @@
 from fastapi import FastAPI, UploadFile, File, Form, Body, Query, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List
-import shutil
 import os
 import uuid
 import json
+import hashlib
+import asyncio
 
 # -----------------------------
 # RAG
 # -----------------------------
-from app.rag.pipeline import rag_answer
-from app.rag.vector_store import ingest_and_store_pdf
+from app.rag.pipeline import rag_answer_async, rag_answer_astream
+from app.rag.title_generator import extractive_title, generate_chat_title_async
+from app.rag.embeddings import get_query_cache_stats, get_embed_cache_stats
+from app.rag.index_cache import get_index_cache
+from app.rag.llm_gateway import get_llm_gateway
+from app.rag.answer_cache import get_answer_cache
 
 # -----------------------------
 # Database
@@ -20,6 +26,15 @@ from app.rag.vector_store import ingest_and_store_pdf
 from app.db.database import SessionLocal, engine
 from app.db import models, crud
 
+# -----------------------------
+# Background ingestion
+# -----------------------------
+from app.ingest_jobs import (
+    submit_ingest_job, resume_ingest_jobs, job_status, remove_faculty_documents
+)
+from app.session_lifecycle import start_session_sweeper
+from app.rag.session_store import delete_session_store
+
 # -----------------------------
 # FastAPI app
 # -----------------------------
@@ -39,6 +54,10 @@ with engine.connect() as _conn:
         "ALTER TABLE faculty_documents ADD COLUMN chapter TEXT",
         "ALTER TABLE faculty_documents ADD COLUMN faculty_uid TEXT",
         "ALTER TABLE subjects ADD COLUMN faculty_uid TEXT",
+        "ALTER TABLE ingest_jobs ADD COLUMN content_hash TEXT",
+        "ALTER TABLE ingest_jobs ADD COLUMN deduplicated BOOLEAN DEFAULT 0",
+        "ALTER TABLE ingest_jobs ADD COLUMN doc_id INTEGER",
+        "ALTER TABLE ingest_jobs ADD COLUMN worker_id TEXT",
     ]:
         try:
             _conn.execute(_text(_stmt))
@@ -65,6 +84,25 @@ UPLOAD_DIR = os.path.join(BASE_DIR, "..", "data", "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
+def save_upload(file: UploadFile, save_path: str) -> str:
+    """Stream an upload to disk, returning the sha256 of its bytes."""
+    digest = hashlib.sha256()
+    with open(save_path, "wb") as buffer:
+        for block in iter(lambda: file.file.read(1024 * 1024), b""):
+            digest.update(block)
+            buffer.write(block)
+    return digest.hexdigest()
+
+
+# -----------------------------
+# Resume ingestion jobs interrupted by a restart
+# -----------------------------
+@app.on_event("startup")
+def resume_ingestion():
+    resume_ingest_jobs()
+    start_session_sweeper()
+
+
 # -----------------------------
 # Health check
 # -----------------------------
@@ -73,6 +111,20 @@ def root():
     return {"status": "Backend running successfully"}
 
 
+# -----------------------------
+# RAG cache counters
+# -----------------------------
+@app.get("/rag/stats")
+def rag_stats():
+    return {
+        "query_embedding_cache": get_query_cache_stats(),
+        "chunk_embedding_cache": get_embed_cache_stats(),
+        "index_cache": get_index_cache().stats(),
+        "llm_gateway": get_llm_gateway().stats(),
+        "answer_cache": get_answer_cache().stats(),
+    }
+
+
 # ============================================================
 # USER PROFILE
 # ============================================================
@@ -217,97 +269,197 @@ class ChatRequest(BaseModel):
     chat_mode: str = "rag"  # "rag" or "general"
 
 
-@app.post("/chat")
-def chat(req: ChatRequest = Body(...)):
-    db = SessionLocal()
+async def _run_db(fn, *args):
+    """
+    fn(db, *args) with its own DB session, on the threadpool: the SQLite
+    driver blocks, and a thread is only held for the query itself, never
+    across an LLM call.
+    """
+    def run():
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    return await run_in_threadpool(run)
+
+
+def _chat_session_id(db, req: ChatRequest) -> int:
+    # Create session if needed
+    if req.session_id is None:
+        return crud.create_chat_session(db, req.user_id).id
+    return req.session_id
+
+
+def _start_chat_turn(db, req: ChatRequest, session_id: int):
+    """
+    Save the user message. Returns (rag_answer arguments, placeholder):
+    a chat still titled "New Chat" gets an instant extractive title,
+    returned as placeholder (None otherwise) until the LLM one is ready.
+    """
+    # Build conversation history BEFORE saving the current user message
+    # so we only pass prior turns (last 6 messages = 3 exchanges).
+    all_prior = crud.get_session_messages(db, session_id)
+    MAX_HISTORY_MSG_LEN = 600
+    history = [
+        {
+            "sender": m.sender,
+            "content": (m.content[:MAX_HISTORY_MSG_LEN] + "…"
+                        if len(m.content) > MAX_HISTORY_MSG_LEN
+                        else m.content)
+        }
+        for m in all_prior[-6:]
+        if m.sender in ("user", "ai")   # skip any system-only entries
+    ]
 
-    try:
-        # Create session if needed
-        if req.session_id is None:
-            session = crud.create_chat_session(db, req.user_id)
-            session_id = session.id
-        else:
-            session_id = req.session_id
-
-        if req.question == "__create_session__":
-            return {"session_id": session_id, "answer": "", "sources": []}
-
-        # Build conversation history BEFORE saving the current user message
-        # so we only pass prior turns (last 6 messages = 3 exchanges).
-        all_prior = crud.get_session_messages(db, session_id)
-        MAX_HISTORY_MSG_LEN = 600
-        history = [
-            {
-                "sender": m.sender,
-                "content": (m.content[:MAX_HISTORY_MSG_LEN] + "…"
-                            if len(m.content) > MAX_HISTORY_MSG_LEN
-                            else m.content)
-            }
-            for m in all_prior[-6:]
-            if m.sender in ("user", "ai")   # skip any system-only entries
-        ]
+    # Save user message
+    crud.add_message(db, session_id, "user", req.question)
 
-        # Save user message
-        crud.add_message(db, session_id, "user", req.question)
+    title = extractive_title(req.question)
+    placeholder = title if crud.replace_chat_title(db, session_id, "New Chat", title) else None
 
-        # Get user profile for academic filtering
-        profile = crud.get_user_profile(db, req.user_id)
-        department = profile.department if profile else None
-        year = profile.year if profile else None
-        section = profile.section if profile else None
+    # Get user profile for academic filtering
+    profile = crud.get_user_profile(db, req.user_id)
 
-        # RAG + fallback (now returns dict with answer + sources)
-        result = rag_answer(
-            query=req.question,
-            user_id=req.user_id,
-            session_id=session_id,
-            chat_mode=req.chat_mode,
-            department=department,
-            year=year,
-            section=section,
-            history=history
+    return dict(
+        query=req.question,
+        user_id=req.user_id,
+        session_id=session_id,
+        chat_mode=req.chat_mode,
+        department=profile.department if profile else None,
+        year=profile.year if profile else None,
+        section=profile.section if profile else None,
+        history=history
+    ), placeholder
+
+
+def _save_answer(db, session_id: int, answer: str, sources: list):
+    # Save AI message with sources
+    crud.add_message(db, session_id, "ai", answer,
+                     sources=json.dumps(sources) if sources else None)
+
+
+# Seconds /chat/stream waits after the answer for the LLM title; after
+# that it sends the placeholder and the client refetches the chat list
+TITLE_WAIT_SECONDS = float(os.getenv("TITLE_WAIT_SECONDS", "2"))
+
+# Title generation in flight, by session: at most one per chat
+_title_tasks = {}
+
+
+async def _generate_title(session_id: int, user_id, messages: list, placeholder: str):
+    """LLM title; replaces the placeholder unless the chat was renamed meanwhile."""
+    try:
+        title = await generate_chat_title_async(messages, user_id)
+        if await _run_db(crud.replace_chat_title, session_id, placeholder, title):
+            return title
+    except Exception as e:
+        print(f"⚠️ Title generation failed for chat {session_id}: {e}")
+    return None
+
+
+def _title_in_background(session_id: int, turn: dict, placeholder: str) -> asyncio.Task:
+    """
+    Start titling a new chat from its user messages (already loaded for the
+    turn's history) while the answer is generated, off the request's path.
+    """
+    task = _title_tasks.get(session_id)
+    if task is None:
+        messages = [m["content"] for m in turn["history"] if m["sender"] == "user"]
+        task = asyncio.create_task(
+            _generate_title(session_id, turn["user_id"], messages + [turn["query"]], placeholder)
         )
+        _title_tasks[session_id] = task
+        task.add_done_callback(lambda _: _title_tasks.pop(session_id, None))
+    return task
 
-        answer = result["answer"]
-        sources = result["sources"]
-
-        # Enrich sources with doc_id for PDF preview.
-        # FAISS stores source = basename(saved_path) = "{uuid}_{original}.pdf"
-        # DB stores file_path = full path ending with "{uuid}_{original}.pdf"
-        enriched_sources = []
-        for src in sources:
-            doc_name = src.get("document_name", "")
-            doc = db.query(models.FacultyDocument).filter(
-                models.FacultyDocument.file_path.like(f"%{doc_name}%"),
-                models.FacultyDocument.file_path != "__FOLDER__"
-            ).first()
-            enriched = dict(src)
-            if doc:
-                enriched["doc_id"] = doc.id
-            enriched_sources.append(enriched)
-        sources = enriched_sources
-
-        # Save AI message with sources
-        crud.add_message(db, session_id, "ai", answer,
-                         sources=json.dumps(sources) if sources else None)
-
-        # Auto-generate title ONLY if still "New Chat"
-        session_obj = db.query(models.ChatSession).filter(
-            models.ChatSession.id == session_id
-        ).first()
-
-        if session_obj and session_obj.title == "New Chat":
-            messages = crud.get_session_messages(db, session_id)
-            text_messages = [m.content for m in messages if m.sender == "user"]
-            if len(text_messages) >= 1:
-                from app.rag.title_generator import generate_chat_title
-                new_title = generate_chat_title(text_messages)
-                crud.update_chat_title(db, session_id, new_title)
-
-        return {"session_id": session_id, "answer": answer, "sources": sources}
 
-    finally:
-        db.close()
+@app.post("/chat")
+async def chat(req: ChatRequest = Body(...)):
+    session_id = await _run_db(_chat_session_id, req)
+
+    if req.question == "__create_session__":
+        return {"session_id": session_id, "answer": "", "sources": []}
+
+    # RAG + fallback (now returns dict with answer + sources)
+    turn, placeholder = await _run_db(_start_chat_turn, req, session_id)
+    if placeholder:
+        _title_in_background(session_id, turn, placeholder)
+    result = await rag_answer_async(**turn)
+
+    answer = result["answer"]
+    # Faculty citations carry the FacultyDocument doc_id (for PDF preview)
+    # straight from the chunk metadata
+    sources = result["sources"]
+
+    await _run_db(_save_answer, session_id, answer, sources)
+
+    return {"session_id": session_id, "answer": answer, "sources": sources}
+
+
+def _ndjson(**event) -> str:
+    return json.dumps(event) + "\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest = Body(...)):
+    """
+    /chat, streamed as NDJSON (one JSON object per line) while the answer
+    is generated:
+
+        {"type": "session", "session_id": 12}
+        {"type": "sources", "sources": [...]}
+        {"type": "token", "text": "..."}          (many)
+        {"type": "done", "answer": "..."}          (answer saved)
+        {"type": "title", "title": "...", "pending": false}   (first answer of a chat only)
+
+    "pending": true means the title is the extractive placeholder and the
+    generated one is still on its way (see TITLE_WAIT_SECONDS).
+
+    A failure ends the stream with {"type": "error", "detail": "..."}.
+    """
+    async def events():
+        try:
+            session_id = await _run_db(_chat_session_id, req)
+            yield _ndjson(type="session", session_id=session_id)
+
+            if req.question == "__create_session__":
+                yield _ndjson(type="sources", sources=[])
+                yield _ndjson(type="done", answer="")
+                return
+
+            turn, placeholder = await _run_db(_start_chat_turn, req, session_id)
+            title_task = _title_in_background(session_id, turn, placeholder) if placeholder else None
+            sources, parts = [], []
+            async for kind, value in rag_answer_astream(**turn):
+                if kind == "sources":
+                    sources = value
+                    yield _ndjson(type="sources", sources=sources)
+                else:
+                    parts.append(value)
+                    yield _ndjson(type="token", text=value)
+
+            answer = "".join(parts).strip()
+            await _run_db(_save_answer, session_id, answer, sources)
+            yield _ndjson(type="done", answer=answer)
+
+            if title_task:
+                # Usually finished already: it ran beside the answer
+                done, _ = await asyncio.wait({title_task}, timeout=TITLE_WAIT_SECONDS)
+                title = title_task.result() if done else None
+                yield _ndjson(type="title", title=title or placeholder, pending=not done)
+        except Exception as e:
+            print(f"⚠️ Streaming chat failed: {e}")
+            yield _ndjson(type="error", detail=str(e))
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}   # no proxy buffering
+    )
 
 
 @app.post("/chat/session")
@@ -359,37 +511,35 @@ def rename_chat(session_id: int, req: RenameChatRequest):
 
 
 @app.post("/chat/{session_id}/regenerate-title")
-def regenerate_title(session_id: int):
-    db = SessionLocal()
-    messages = crud.get_session_messages(db, session_id)
-    texts = [m.content for m in messages if m.sender == "user"]
-    from app.rag.title_generator import generate_chat_title
-    title = generate_chat_title(texts)
-    crud.rename_session(db, session_id, title)
-    db.close()
+async def regenerate_title(session_id: int):
+    def user_messages(db):
+        session = db.query(models.ChatSession).get(session_id)
+        messages = crud.get_session_messages(db, session_id)
+        texts = [m.content for m in messages if m.sender == "user"]
+        return (session.user_id if session else None), texts
+
+    user_id, texts = await _run_db(user_messages)
+    title = await generate_chat_title_async(texts, user_id=user_id)
+    await _run_db(crud.rename_session, session_id, title)
     return {"title": title}
 
 
 @app.delete("/chat/{session_id}")
 def delete_chat(session_id: int):
     db = SessionLocal()
-    session = db.query(models.ChatSession).filter(
-        models.ChatSession.id == session_id
-    ).first()
-
-    if not session:
-        db.close()
-        raise HTTPException(status_code=404, detail="Chat not found")
-
     try:
-        db.delete(session)
-        db.commit()
+        deleted = crud.delete_session(db, session_id)
     except Exception as e:
         db.rollback()
-        db.close()
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        db.close()
 
-    db.close()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    # The session's uploaded-document index goes with it
+    delete_session_store(session_id)
     return {"message": "Chat deleted"}
 
 
@@ -429,34 +579,41 @@ def upload_faculty_pdf(
     file_id = str(uuid.uuid4())
     save_path = os.path.join(UPLOAD_DIR, f"{file_id}_{file.filename}")
 
-    with open(save_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # Ingest with academic metadata
-    ingest_and_store_pdf(
-        pdf_path=save_path,
-        owner_type="faculty",
-        owner_id=None,
-        department=department,
-        year=year,
-        section=section
-    )
+    content_hash = save_upload(file, save_path)
 
     # Save file record in DB with metadata
     db = SessionLocal()
     try:
         logical_path = f"{path}/{file.filename}" if path else file.filename
-        crud.add_faculty_file(
+        doc = crud.add_faculty_file(
             db, name=file.filename, file_path=save_path,
             logical_path=logical_path,
             faculty_uid=faculty_uid, subject_id=subject_id,
             chapter=chapter or None,
             department=department, year=year, section=section
         )
+        doc_id = doc.id
     finally:
         db.close()
 
-    return {"message": "Faculty PDF uploaded and indexed"}
+    # Index in the background with academic metadata
+    # (a file already uploaded before reuses its chunks and vectors)
+    job_id, deduplicated = submit_ingest_job(
+        pdf_path=save_path,
+        filename=file.filename,
+        owner_type="faculty",
+        department=department,
+        year=year,
+        section=section,
+        content_hash=content_hash,
+        doc_id=doc_id
+    )
+
+    return {
+        "message": "Faculty PDF uploaded, indexing started",
+        "job_id": job_id,
+        "deduplicated": deduplicated
+    }
 
 
 @app.post("/upload/student")
@@ -484,30 +641,46 @@ def upload_student_pdf(
     save_path = os.path.join(UPLOAD_DIR, f"{file_id}_{file.filename}")
 
     try:
-        with open(save_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        content_hash = save_upload(file, save_path)
 
-        ingest_and_store_pdf(
+        # Indexed in the background; the job posts the "indexed" chat
+        # message to the session when it finishes
+        job_id, deduplicated = submit_ingest_job(
             pdf_path=save_path,
+            filename=file.filename,
             owner_type="student",
             owner_id=user_id,
-            session_id=session_id
+            session_id=session_id,
+            content_hash=content_hash
         )
 
     except Exception as e:
-        db.close()
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
-    # Persist upload confirmation as a chat message so it appears after reload
-    crud.add_message(
-        db, session_id, "ai",
-        f"📄 **{file.filename}** has been uploaded and indexed successfully. "
-        f"You can now ask questions about it, request a summary, or — if this is your resume — "
-        f"ask for interview preparation, likely interview questions, or improvement suggestions."
-    )
+    finally:
+        db.close()
 
-    db.close()
-    return {"message": "PDF uploaded", "session_id": session_id}
+    return {
+        "message": "PDF uploaded",
+        "session_id": session_id,
+        "job_id": job_id,
+        "deduplicated": deduplicated
+    }
+
+
+# ============================================================
+# INGESTION JOB STATUS
+# ============================================================
+@app.get("/ingest/jobs/{job_id}")
+def get_ingest_job(job_id: str):
+    db = SessionLocal()
+    try:
+        job = crud.get_ingest_job(db, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job_status(job)
+    finally:
+        db.close()
 
 
 # ============================================================
@@ -797,7 +970,8 @@ class DeleteFolderRequest(BaseModel):
 def delete_faculty_folder_api(req: DeleteFolderRequest):
     db = SessionLocal()
     try:
-        crud.delete_faculty_item(db, req.path)
+        deleted = crud.delete_faculty_item(db, req.path)
+        remove_faculty_documents(deleted)
         return {"message": "Folder deleted successfully"}
     finally:
         db.close()
@@ -843,7 +1017,8 @@ def delete_faculty_file(item_id: int):
         if not item:
             raise HTTPException(status_code=404, detail="Item not found")
         logical_path = item.logical_path
-        crud.delete_faculty_item(db, logical_path)
+        deleted = crud.delete_faculty_item(db, logical_path)
+        remove_faculty_documents(deleted)
         return {"message": "Deleted successfully"}
     finally:
         db.close()
@@ -0,0 +1,168 @@
+"""
+Semantic cache of answers grounded in faculty material.
+
+Many students ask near-identical questions ("explain deadlock conditions")
+that retrieve the same faculty chunks. A history-free turn answered from
+the faculty index is cached under:
+
+- the index path and its manifest version: any append, delete or
+  compaction bumps the version, and the first lookup that sees the new
+  version drops every entry of that index,
+- the exact set of chunk ids the answer was generated from,
+- the query embedding: a later question retrieving the same chunks is a
+  hit only if its embedding is at least ANSWER_CACHE_MIN_SIMILARITY
+  (cosine) close to a cached question.
+
+Entries expire after ANSWER_CACHE_TTL_SECONDS and the least recently used
+ones are evicted past ANSWER_CACHE_MAX_ENTRIES. stats() reports the hit
+rate and the LLM time saved (the generation time of each answer served
+from the cache).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .index_store import manifest_path, read_manifest
+
+
+# -----------------------------
+# Config
+# -----------------------------
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+ANSWER_CACHE_MIN_SIMILARITY = float(os.getenv("ANSWER_CACHE_MIN_SIMILARITY", "0.92"))
+
+
+def index_version(index_path: str):
+    """Manifest version of a store; None for a legacy single-file index (not cached)."""
+    if not os.path.exists(manifest_path(index_path)):
+        return None
+    return read_manifest(index_path)["version"]
+
+
+def answer_key(index_path: str, version, chunk_ids, query_vec: np.ndarray):
+    """Cache key of a turn, or None if it cannot be cached."""
+    if not ANSWER_CACHE_ENABLED or version is None or not chunk_ids:
+        return None
+    return (index_path, version, frozenset(chunk_ids), np.asarray(query_vec, dtype="float32").ravel())
+
+
+class SemanticAnswerCache:
+    """
+    Thread-safe TTL + LRU cache. Answers are grouped by (index, chunk ids);
+    a group holds the differently-worded questions that retrieved them.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 min_similarity: float = ANSWER_CACHE_MIN_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.min_similarity = min_similarity
+        self._groups = OrderedDict()   # (index_path, chunk_ids) -> [(vec, answer, created, seconds)]
+        self._versions = {}            # index_path -> manifest version of its entries
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidated = 0
+        self.seconds_saved = 0.0
+
+    def _drop_group(self, group_key):
+        self._size -= len(self._groups.pop(group_key))
+
+    def _sync_version(self, index_path: str, version):
+        """Drop the entries of an index whose chunks changed (lock held)."""
+        if self._versions.get(index_path) == version:
+            return
+        stale = [g for g in self._groups if g[0] == index_path]
+        for group_key in stale:
+            self.invalidated += len(self._groups[group_key])
+            self._drop_group(group_key)
+        self._versions[index_path] = version
+
+    def get(self, key):
+        """Cached answer for key, or None."""
+        if key is None:
+            return None
+        index_path, version, chunk_ids, vec = key
+        now = time.monotonic()
+
+        with self._lock:
+            # The version was just read from disk, so it is the current one
+            self._sync_version(index_path, version)
+            group_key = (index_path, chunk_ids)
+            entries = self._groups.get(group_key)
+            if entries:
+                fresh = [e for e in entries if now - e[2] < self.ttl_seconds]
+                self.expired += len(entries) - len(fresh)
+                self._size -= len(entries) - len(fresh)
+                if fresh:
+                    self._groups[group_key] = fresh
+                    self._groups.move_to_end(group_key)
+                    best = max(fresh, key=lambda e: float(e[0] @ vec))
+                    if float(best[0] @ vec) >= self.min_similarity:
+                        self.hits += 1
+                        self.seconds_saved += best[3]
+                        return best[1]
+                else:
+                    del self._groups[group_key]
+            self.misses += 1
+            return None
+
+    def put(self, key, answer: str, seconds: float):
+        """Cache an answer that took `seconds` to generate."""
+        if key is None or not answer:
+            return
+        index_path, version, chunk_ids, vec = key
+
+        with self._lock:
+            if self._versions.get(index_path) != version:
+                return   # the index changed while this answer was generated
+            group_key = (index_path, chunk_ids)
+            entries = self._groups.setdefault(group_key, [])
+            self._groups.move_to_end(group_key)
+            if any(float(e[0] @ vec) >= self.min_similarity for e in entries):
+                return   # a concurrent request cached this question first
+            entries.append((vec, answer, time.monotonic(), seconds))
+            self._size += 1
+
+            while self._size > self.max_entries:
+                oldest_key, oldest = next(iter(self._groups.items()))
+                oldest.pop(0)
+                self._size -= 1
+                self.evictions += 1
+                if not oldest:
+                    del self._groups[oldest_key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "seconds_saved": round(self.seconds_saved, 2),
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "invalidated": self.invalidated,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticAnswerCache()
+        return _cache
@@ -0,0 +1,290 @@
+"""
+Chunk text + metadata store, one SQLite file per FAISS index.
+
+Rows are keyed by FAISS vector id, so a query only reads the rows of the
+hits it returns instead of unpickling the whole corpus. The academic
+filter fields are also loaded as numpy columns (cached) for filtered search.
+"""
+import functools
+import json
+import os
+import pickle
+import sqlite3
+
+import numpy as np
+
+from .index_cache import get_index_cache
+
+
+# Columns stored natively; anything else in a metadata dict goes to `extra`
+COLUMNS = (
+    "text", "source", "page", "ocr",
+    "owner_type", "owner_id", "session_id",
+    "department", "year", "section", "doc_id",
+)
+FILTER_FIELDS = ("department", "year", "section")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    source TEXT,
+    page INTEGER,
+    ocr INTEGER,
+    owner_type TEXT,
+    owner_id TEXT,
+    session_id INTEGER,
+    department TEXT,
+    year INTEGER,
+    section TEXT,
+    extra TEXT,
+    doc_id INTEGER
+)
+"""
+# Explicit column order: doc_id was added to existing stores by ALTER TABLE
+_ROW = f"id, {', '.join(COLUMNS)}, extra"
+_INSERT = f"INSERT OR REPLACE INTO chunks ({_ROW}) VALUES ({', '.join('?' * (len(COLUMNS) + 2))})"
+
+
+def chunk_store_path(index_path: str) -> str:
+    return index_path + ".chunks"
+
+
+def _connect(db_path: str):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute(_SCHEMA)
+    if "doc_id" not in {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}:
+        try:
+            conn.execute("ALTER TABLE chunks ADD COLUMN doc_id INTEGER")
+        except sqlite3.OperationalError:
+            pass   # added by another worker
+    conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks (doc_id)")
+    return conn
+
+
+def _row_values(vector_id: int, meta: dict) -> tuple:
+    extra = {k: v for k, v in meta.items() if k not in COLUMNS}
+    return (
+        vector_id,
+        *(meta.get(c) for c in COLUMNS),
+        json.dumps(extra) if extra else None,
+    )
+
+
+def _row_to_meta(row) -> dict:
+    meta = {c: v for c, v in zip(COLUMNS, row[1:-1]) if v is not None}
+    meta["ocr"] = bool(meta.get("ocr"))
+    if row[-1]:
+        meta.update(json.loads(row[-1]))
+    return meta
+
+
+# -----------------------------
+# Writes
+# -----------------------------
+def append_chunks(db_path: str, start_id: int, metadatas: list):
+    """
+    Store chunk metadata (each dict must contain "text") under vector ids
+    start_id, start_id + 1, ... Rows left over from an interrupted write
+    with the same ids are replaced.
+    """
+    conn = _connect(db_path)
+    try:
+        with conn:
+            conn.executemany(
+                _INSERT,
+                [_row_values(start_id + i, m) for i, m in enumerate(metadatas)]
+            )
+    finally:
+        conn.close()
+    get_index_cache().invalidate(db_path)
+
+
+def copy_chunks(src_db: str, dst_db: str, start_id: int, overrides: dict = None,
+                batch_size: int = 1000) -> int:
+    """
+    Copy every chunk of `src_db` to `dst_db`, source id i becoming
+    start_id + i, with the fields in `overrides` replaced.
+    Returns the number of chunks copied.
+    """
+    if not os.path.exists(src_db):
+        return 0
+    overrides = overrides or {}
+    src, dst = _connect(src_db), _connect(dst_db)
+    try:
+        copied, last_id = 0, -1
+        with dst:
+            while True:
+                rows = src.execute(
+                    f"SELECT {_ROW} FROM chunks WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                dst.executemany(
+                    _INSERT,
+                    [_row_values(start_id + row[0], dict(_row_to_meta(row), **overrides)) for row in rows]
+                )
+                copied += len(rows)
+                last_id = rows[-1][0]
+    finally:
+        src.close()
+        dst.close()
+    get_index_cache().invalidate(dst_db)
+    return copied
+
+
+def delete_chunks(db_path: str, ids: list):
+    """Delete the rows of the given vector ids."""
+    conn = _connect(db_path)
+    try:
+        with conn:
+            for i in range(0, len(ids), 500):   # SQLite bound-parameter limit
+                batch = ids[i:i + 500]
+                conn.execute(f"DELETE FROM chunks WHERE id IN ({', '.join('?' * len(batch))})", batch)
+    finally:
+        conn.close()
+    get_index_cache().invalidate(db_path)
+
+
+def link_source_chunks(db_path: str, source: str, doc_id: int) -> int:
+    """Set doc_id on the chunks of `source` that have none; returns the row count."""
+    if not os.path.exists(db_path):
+        return 0
+    conn = _connect(db_path)
+    try:
+        with conn:
+            count = conn.execute(
+                "UPDATE chunks SET doc_id = ? WHERE doc_id IS NULL AND source = ?", (doc_id, source)
+            ).rowcount
+    finally:
+        conn.close()
+    get_index_cache().invalidate(db_path)
+    return count
+
+
+# -----------------------------
+# Reads
+# -----------------------------
+def get_chunks(db_path: str, ids) -> dict:
+    """{vector_id: metadata dict} for the given ids (missing ids are omitted)."""
+    ids = [int(i) for i in ids if i >= 0]
+    if not ids or not os.path.exists(db_path):
+        return {}
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(
+            f"SELECT {_ROW} FROM chunks WHERE id IN ({', '.join('?' * len(ids))})", ids
+        ).fetchall()
+    finally:
+        conn.close()
+    return {row[0]: _row_to_meta(row) for row in rows}
+
+
+def find_chunk_ids(db_path: str, **match) -> list:
+    """Ids of the chunks whose columns equal `match` (None matches NULL)."""
+    if not os.path.exists(db_path):
+        return []
+    clauses, params = [], []
+    for column, value in match.items():
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown chunk column: {column}")
+        if value is None:
+            clauses.append(f"{column} IS NULL")
+        else:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(
+            f"SELECT id FROM chunks WHERE {' AND '.join(clauses) or '1'} ORDER BY id", params
+        ).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+def _read_filter_columns(db_path: str, min_size: int = 0):
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(
+            f"SELECT id, {', '.join(FILTER_FIELDS)} FROM chunks ORDER BY id"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    # Ids past the last row (deleted chunks) are padded up to min_size
+    size = max(rows[-1][0] + 1 if rows else 0, min_size)
+    columns = {field: np.full(size, "", dtype=object) for field in FILTER_FIELDS}
+    for row in rows:
+        for field, value in zip(FILTER_FIELDS, row[1:]):
+            if value is not None and value != "":
+                columns[field][row[0]] = str(value)
+    # Fixed-width unicode arrays compare much faster than object arrays
+    columns = {f: c.astype(str) for f, c in columns.items()}
+    return columns, sum(c.nbytes for c in columns.values())
+
+
+def load_filter_columns(db_path: str, min_size: int = 0) -> dict:
+    """
+    One numpy string column per filter field, indexed by vector id.
+    Chunks without a value for a field get "" (they match any filter).
+
+    `min_size` is the number of ids the caller knows are published (the
+    manifest's next_id): columns are padded to it, since chunk rows are
+    written before their ids are published. A cached copy shorter than
+    that (another worker appended within the same mtime tick) is reloaded.
+    """
+    if not os.path.exists(db_path):
+        return {field: np.array([], dtype=str) for field in FILTER_FIELDS}
+    cache = get_index_cache()
+    key = (db_path, "filters")
+    loader = functools.partial(_read_filter_columns, min_size=min_size)
+    columns = cache.get_or_load(db_path, loader, key=key)
+    if len(columns[FILTER_FIELDS[0]]) < min_size:
+        cache.invalidate(db_path)
+        columns = cache.get_or_load(db_path, loader, key=key)
+    return columns
+
+
+# -----------------------------
+# Migration from pickled .meta lists
+# -----------------------------
+def migrate_pickle_metadata(meta_path: str, db_path: str) -> int:
+    """
+    Convert a legacy pickled metadata list (list position == vector id)
+    into a chunk store. The .meta file is kept as .meta.migrated.
+    Returns the number of chunks migrated.
+    """
+    with open(meta_path, "rb") as f:
+        metadatas = pickle.load(f)
+
+    tmp_path = f"{db_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    append_chunks(tmp_path, 0, metadatas)
+    try:
+        # No-clobber publish: never overwrite a store another worker already
+        # migrated (and may have appended to since)
+        os.link(tmp_path, db_path)
+    except FileExistsError:
+        return 0
+    finally:
+        os.remove(tmp_path)
+    os.replace(meta_path, meta_path + ".migrated")
+    get_index_cache().invalidate(db_path)
+    return len(metadatas)
+
+
+def ensure_chunk_store(index_path: str, meta_path: str = None) -> str:
+    """Chunk store path for an index, migrating a legacy .meta file on first use."""
+    db_path = chunk_store_path(index_path)
+    meta_path = meta_path or index_path + ".meta"
+    if not os.path.exists(db_path) and os.path.exists(meta_path):
+        try:
+            count = migrate_pickle_metadata(meta_path, db_path)
+            print(f"📦 Migrated {count} chunks from {meta_path} to {db_path}")
+        except FileNotFoundError:
+            # Another worker migrated the same file first
+            if not os.path.exists(db_path):
+                raise
+    return db_path
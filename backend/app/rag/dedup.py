@@ -0,0 +1,131 @@
+"""
+Boilerplate and near-duplicate suppression during ingestion.
+
+Lecture PDFs repeat headers, footers and copyright lines on every page,
+and slide decks repeat whole slides. Two streaming filters, applied page
+by page within one document:
+
+- Boilerplate lines: a short line among the first or last
+  BOILERPLATE_EDGE_LINES of a page that already appeared there, verbatim,
+  on BOILERPLATE_MIN_PAGES earlier pages is dropped from later pages, so
+  it is indexed only in its first few occurrences. Standalone page
+  numbers ("12", "Page 3", "Page 3 of 40") all count as the same line;
+  other lines with digits ("Step 1", "Lab 2: ...") must repeat exactly.
+- Near-duplicate chunks: each chunk gets a MinHash signature over word
+  3-shingles; LSH banding finds earlier chunks with an estimated Jaccard
+  similarity of at least NEAR_DUP_THRESHOLD, and such chunks are dropped.
+"""
+import os
+import re
+import zlib
+
+import numpy as np
+
+
+INGEST_DEDUP = os.getenv("INGEST_DEDUP", "1") == "1"
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))
+BOILERPLATE_EDGE_LINES = 3          # headers/footers sit at the top or bottom of a page
+BOILERPLATE_MAX_LINE = 120          # longer lines are content, never boilerplate
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+
+MINHASH_PERMS = 64
+LSH_BANDS = 16                      # 16 bands x 4 rows: candidates from ~0.5 similarity
+SHINGLE_SIZE = 3
+
+_PRIME = np.uint64(4294967291)      # largest prime below 2**32
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, int(_PRIME), MINHASH_PERMS, dtype=np.uint64)
+_B = _rng.integers(0, int(_PRIME), MINHASH_PERMS, dtype=np.uint64)
+
+_WORD = re.compile(r"\w+")
+_PAGE_NUMBER = re.compile(r"(page\s*)?\d+(\s*(of|/)\s*\d+)?", re.IGNORECASE)
+
+
+def _boilerplate_key(line: str) -> str:
+    key = line.strip().lower()
+    return "<page number>" if _PAGE_NUMBER.fullmatch(key) else key
+
+
+def _shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text: str):
+    """MinHash signature (MINHASH_PERMS uint64 values), or None for empty text."""
+    shingles = _shingles(text)
+    if not shingles:
+        return None
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    # (a * h + b) mod p stays below 2**64 for a, b < p < 2**32 and h < 2**32
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+class IngestDeduper:
+    """Per-document filter state plus the numbers for the ingest report."""
+
+    def __init__(self):
+        self._line_pages = {}           # normalized line -> pages seen on
+        self._buckets = {}              # (band, band hash) -> signature ids
+        self._signatures = []
+        self.lines_removed = 0
+        self.chars_removed = 0
+        self.chunks_seen = 0
+        self.chunks_dropped = 0
+
+    def strip_boilerplate(self, text: str, page: int) -> str:
+        lines = text.split("\n")
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        edges = set(filled[:BOILERPLATE_EDGE_LINES] + filled[-BOILERPLATE_EDGE_LINES:])
+
+        kept = []
+        for i, line in enumerate(lines):
+            key = _boilerplate_key(line)
+            if i not in edges or len(key) > BOILERPLATE_MAX_LINE:
+                kept.append(line)
+                continue
+            pages = self._line_pages.setdefault(key, set())
+            if len(pages) >= BOILERPLATE_MIN_PAGES and page not in pages:
+                self.lines_removed += 1
+                self.chars_removed += len(line) + 1
+                continue
+            if len(pages) < BOILERPLATE_MIN_PAGES:
+                pages.add(page)
+            kept.append(line)
+        return "\n".join(kept)
+
+    def is_duplicate(self, chunk: str) -> bool:
+        """True if a near-identical chunk was already kept (the chunk is then dropped)."""
+        self.chunks_seen += 1
+        signature = minhash(chunk)
+        if signature is None:
+            return False
+
+        rows = MINHASH_PERMS // LSH_BANDS
+        keys = [(band, signature[band * rows:(band + 1) * rows].tobytes())
+                for band in range(LSH_BANDS)]
+        candidates = {i for key in keys for i in self._buckets.get(key, ())}
+        for i in candidates:
+            if np.mean(self._signatures[i] == signature) >= NEAR_DUP_THRESHOLD:
+                self.chunks_dropped += 1
+                self.chars_removed += len(chunk)
+                return True
+
+        sig_id = len(self._signatures)
+        self._signatures.append(signature)
+        for key in keys:
+            self._buckets.setdefault(key, []).append(sig_id)
+        return False
+
+    def report(self) -> dict:
+        return {
+            "chunks_seen": self.chunks_seen,
+            "chunks_dropped": self.chunks_dropped,
+            "boilerplate_lines_removed": self.lines_removed,
+            "chars_removed": self.chars_removed,
+            "index_reduction": round(self.chunks_dropped / self.chunks_seen, 4)
+            if self.chunks_seen else 0.0,
+        }
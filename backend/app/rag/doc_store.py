@@ -0,0 +1,141 @@
+"""
+Content-addressed document stores for upload deduplication.
+
+Every distinct PDF (by sha256 of its bytes) is parsed, chunked and
+embedded once, into its own store at data/faiss/docs/{sha256}.faiss. Once
+complete the store is frozen (index_store.mark_shared) and each upload of
+that content — by any faculty member or into any student session — is
+attached to its target index: the target's manifest references the shared
+segment files and only the chunk rows are copied, with that upload's
+owner, academic filters and file name. detach_document removes one
+upload from an index again. A document store no index references any
+more is deleted by session_store.collect_document_stores.
+"""
+import json
+import os
+
+from .vector_store import FAISS_BASE_PATH, ingest_and_store_pdf, ensure_dir
+from .ingest import clean_source_name
+from .index_store import attach_shared, delete_vectors, mark_shared, read_manifest, writer_lock
+
+
+DOCS_PATH = os.path.join(FAISS_BASE_PATH, "docs")
+
+
+def doc_index_path(content_hash: str) -> str:
+    return os.path.join(DOCS_PATH, f"{content_hash}.faiss")
+
+
+def document_lock(content_hash: str):
+    """Held while a document is ingested, attached or garbage collected."""
+    return writer_lock(doc_index_path(content_hash) + ".ingest")
+
+
+def _progress_path(content_hash: str) -> str:
+    return doc_index_path(content_hash) + ".progress"
+
+
+def read_progress(content_hash: str) -> dict:
+    """
+    {"pages_done", "pages_total"} of the document's ingestion so far, plus
+    "skip_chunks" (chunks from pages_done on that are already indexed) and
+    its "dedup" report once complete (after a resume, the report covers
+    the pages ingested by the final run).
+    """
+    try:
+        with open(_progress_path(content_hash), encoding="utf-8") as f:
+            return {"skip_chunks": 0, **json.load(f)}
+    except FileNotFoundError:
+        return {"pages_done": 0, "pages_total": None, "skip_chunks": 0}
+
+
+def _write_progress(content_hash: str, pages_done: int, pages_total: int,
+                    skip_chunks: int = 0, dedup: dict = None):
+    path = _progress_path(content_hash)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"pages_done": pages_done, "pages_total": pages_total,
+                   "skip_chunks": skip_chunks, "dedup": dedup}, f)
+    os.replace(tmp_path, path)
+
+
+def is_ready(content_hash: str) -> bool:
+    """True once the document is fully ingested and can be attached."""
+    return bool(read_manifest(doc_index_path(content_hash)).get("shared"))
+
+
+def ingest_document(pdf_path: str, content_hash: str, progress=None) -> dict:
+    """
+    Parse, chunk and embed a document into its shared store, unless that
+    was already done. Only one worker (thread or process) ingests a given
+    document; others wait here and then find it ready. An interrupted
+    ingestion resumes from the last committed chunk.
+    """
+    index_path = doc_index_path(content_hash)
+    ensure_dir(DOCS_PATH)
+
+    with document_lock(content_hash):
+        if is_ready(content_hash):
+            return read_progress(content_hash)
+
+        def on_progress(pages_done, pages_total, chunks_added, skip_chunks):
+            _write_progress(content_hash, pages_done, pages_total, skip_chunks)
+            if progress:
+                progress(pages_done, pages_total, chunks_added)
+
+        # Owner fields are per upload and are filled in by attach_document
+        done = read_progress(content_hash)
+        result = ingest_and_store_pdf(
+            pdf_path=pdf_path,
+            owner_type=None,
+            owner_id=None,
+            start_page=done["pages_done"],
+            skip_chunks=done["skip_chunks"],
+            progress=on_progress,
+            index_path=index_path
+        )
+        pages = read_progress(content_hash)
+        _write_progress(content_hash, pages["pages_done"], pages["pages_total"],
+                        dedup=result["dedup"])
+        mark_shared(index_path)
+        print(f"📚 Document {content_hash[:12]} ingested and shared")
+        return read_progress(content_hash)
+
+
+def attach_document(content_hash: str, index_path: str, pdf_path: str,
+                    owner_type: str, owner_id=None, session_id: int = None,
+                    department: str = None, year: int = None,
+                    section: str = None, doc_id: int = None) -> range:
+    """
+    Make a ready document searchable in `index_path` for one upload.
+    `doc_id` (the FacultyDocument id) links the chunks to the upload so
+    detach_document can remove them. Raises ValueError if the document
+    store was garbage collected since it was ingested (the job retries).
+    """
+    ensure_dir(os.path.dirname(index_path))
+    overrides = {
+        "owner_type": owner_type,
+        "owner_id": owner_id,
+        "session_id": session_id,
+        "source": clean_source_name(pdf_path),
+        "department": department or None,
+        "year": year or None,
+        "section": section or None,
+        "doc_id": doc_id,
+    }
+    with document_lock(content_hash):
+        return attach_shared(index_path, doc_index_path(content_hash), overrides)
+
+
+def detach_document(index_path: str, doc_id: int, legacy_sources=()) -> int:
+    """
+    Remove the chunks of one upload from `index_path` (the shared store is
+    kept for future uploads of the same content). Chunks indexed before
+    they carried a doc_id are matched by source name; `legacy_sources`
+    must only hold names no other document has. Returns the number of
+    chunks removed.
+    """
+    removed = delete_vectors(index_path, doc_id=doc_id)
+    for source in legacy_sources:
+        removed += delete_vectors(index_path, doc_id=None, source=source)
+    return removed
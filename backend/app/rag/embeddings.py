@@ -1,5 +1,16 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
 from langchain_huggingface import HuggingFaceEmbeddings
 
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
 # Singleton embeddings object
 _embeddings = None
 
@@ -7,7 +18,166 @@ def get_embeddings():
     global _embeddings
     if _embeddings is None:
         _embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
+            model_name=EMBED_MODEL_NAME,
             model_kwargs={"device": "cpu"}
         )
     return _embeddings
+
+
+# -----------------------------
+# Query embedding cache
+# -----------------------------
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "2048"))
+
+_query_cache = OrderedDict()   # normalized text -> (1, dim) float32 vector
+_query_lock = threading.Lock()
+_query_stats = {"hits": 0, "misses": 0}
+
+
+def _normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+def embed_query_vector(query: str) -> np.ndarray:
+    """
+    L2-normalized float32 query vector of shape (1, dim), ready for FAISS search.
+    Repeated questions are served from a bounded LRU cache keyed by the
+    whitespace/case-normalized query text.
+    """
+    key = _normalize_query(query)
+
+    with _query_lock:
+        vec = _query_cache.get(key)
+        if vec is not None:
+            _query_cache.move_to_end(key)
+            _query_stats["hits"] += 1
+            return vec
+        _query_stats["misses"] += 1
+
+    vec = np.array([get_embeddings().embed_query(key)], dtype="float32")
+    vec /= max(float(np.linalg.norm(vec)), 1e-12)   # same as faiss.normalize_L2
+    vec.flags.writeable = False                     # shared between requests
+
+    with _query_lock:
+        _query_cache[key] = vec
+        while len(_query_cache) > QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    return vec
+
+
+def get_query_cache_stats() -> dict:
+    with _query_lock:
+        return {"size": len(_query_cache), "max_size": QUERY_CACHE_SIZE, **_query_stats}
+
+
+# -----------------------------
+# Chunk embedding cache (on disk)
+# -----------------------------
+# Re-ingesting a document (after a crash, a metadata change or a revised
+# edition) mostly embeds chunks seen before. Vectors are cached in SQLite
+# keyed by (model, sha256 of the chunk text), shared by all workers, and
+# evicted least-recently-used once the cache passes EMBED_CACHE_MAX_BYTES.
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "data/embed_cache.db")
+EMBED_CACHE_MAX_BYTES = int(os.getenv("EMBED_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+_ROW_OVERHEAD = 64   # key + bookkeeping bytes per cached vector (estimate)
+
+_embed_cache_lock = threading.Lock()
+_embed_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _connect_embed_cache():
+    os.makedirs(os.path.dirname(EMBED_CACHE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(EMBED_CACHE_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS embeddings ("
+        "model TEXT NOT NULL, text_hash BLOB NOT NULL, vector BLOB NOT NULL, "
+        "last_used REAL NOT NULL, PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+    return conn
+
+
+def _text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def embed_documents_cached(texts: list) -> np.ndarray:
+    """
+    float32 embeddings of shape (len(texts), dim), the same values
+    get_embeddings().embed_documents(texts) returns. Cached vectors are
+    read from disk; only the misses (deduplicated) go to the model, in one
+    batch.
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype="float32")
+
+    hashes = [_text_hash(t) for t in texts]
+    unique = list(dict.fromkeys(hashes))
+    found = {}
+
+    conn = _connect_embed_cache()
+    try:
+        for i in range(0, len(unique), 500):   # SQLite bound-parameter limit
+            batch = unique[i:i + 500]
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                f"AND text_hash IN ({', '.join('?' * len(batch))})",
+                [EMBED_MODEL_NAME, *batch]
+            ).fetchall()
+            found.update((h, np.frombuffer(v, dtype="float32")) for h, v in rows)
+
+        missing = [h for h in unique if h not in found]
+        if missing:
+            first_text = {}
+            for h, t in zip(hashes, texts):
+                first_text.setdefault(h, t)
+            vectors = np.asarray(
+                get_embeddings().embed_documents([first_text[h] for h in missing]),
+                dtype="float32"
+            )
+            found.update(zip(missing, vectors))
+
+        now = time.time()
+        with conn:
+            if found:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                    [(EMBED_MODEL_NAME, h, found[h].tobytes(), now) for h in unique]
+                )
+            if missing:
+                _evict(conn, vector_bytes=found[missing[0]].nbytes)
+    finally:
+        conn.close()
+
+    with _embed_cache_lock:
+        _embed_cache_stats["hits"] += len(unique) - len(missing)
+        _embed_cache_stats["misses"] += len(missing)
+
+    return np.stack([found[h] for h in hashes])
+
+
+def _evict(conn, vector_bytes: int):
+    max_rows = EMBED_CACHE_MAX_BYTES // (vector_bytes + _ROW_OVERHEAD)
+    count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    if count <= max_rows:
+        return
+    # Trim to 90% so eviction does not run on every insert
+    excess = count - int(max_rows * 0.9)
+    conn.execute(
+        "DELETE FROM embeddings WHERE (model, text_hash) IN ("
+        "SELECT model, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+        (excess,)
+    )
+    with _embed_cache_lock:
+        _embed_cache_stats["evictions"] += excess
+
+
+def get_embed_cache_stats() -> dict:
+    with _embed_cache_lock:
+        stats = dict(_embed_cache_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+    stats["max_bytes"] = EMBED_CACHE_MAX_BYTES
+    stats["disk_bytes"] = os.path.getsize(EMBED_CACHE_PATH) if os.path.exists(EMBED_CACHE_PATH) else 0
+    return stats
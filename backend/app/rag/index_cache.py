@@ -0,0 +1,105 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+# -----------------------------
+# Config
+# -----------------------------
+# Upper bound on the bytes held by the process-wide index/metadata cache.
+# There can be thousands of small session indexes, so entries are evicted
+# least-recently-used first once the budget is exceeded.
+INDEX_CACHE_MAX_BYTES = int(os.getenv("INDEX_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def file_version(path: str):
+    """(inode, mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class LRUByteCache:
+    """
+    Thread-safe LRU cache bounded by an estimated byte size.
+
+    Entries are keyed by file path and tagged with the file version they
+    were loaded from, so a rewritten file is reloaded on the next lookup.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (version, value, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, path: str, loader, key=None):
+        """
+        Return the cached value for `path`, calling `loader(path)` on a miss.
+        `loader` must return (value, nbytes). Pass `key=(path, tag)` to cache
+        a value derived from `path`; it is invalidated together with `path`.
+        """
+        key = key if key is not None else path
+        version = file_version(path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value, nbytes = loader(path)
+
+        with self._lock:
+            self._drop(key)
+            if nbytes <= self.max_bytes:
+                self._entries[key] = (version, value, nbytes)
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    oldest = next(iter(self._entries))
+                    self._drop(oldest)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, path: str):
+        """Drop `path` and every value derived from it."""
+        with self._lock:
+            for key in [k for k in self._entries
+                        if k == path or (isinstance(k, tuple) and k[0] == path)]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+
+# Singleton shared by every retrieval in this worker process
+_cache = LRUByteCache(INDEX_CACHE_MAX_BYTES)
+
+
+def get_index_cache() -> LRUByteCache:
+    return _cache
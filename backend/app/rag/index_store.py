@@ -0,0 +1,708 @@
+"""
+Append-only, segmented persistence for FAISS indexes.
+
+An index at `index_path` is a manifest (`index_path + ".manifest"`) listing
+immutable segment files, each covering a contiguous range of vector ids:
+
+    {"version": 3, "next_id": 1250,
+     "segments": [{"file": "index.faiss", "start": 0, "count": 1200},
+                  {"file": "index.faiss.seg/000002.idx", "start": 1200, "count": 50}]}
+
+An upload writes one new segment file and then atomically replaces the
+manifest, so it costs O(upload) I/O instead of rewriting the whole index.
+Readers always search the segments of a single manifest version. A
+background compaction merges segments into a new base segment once there
+are too many. The files it supersedes are listed in the manifest
+("retired": [{"file": ..., "at": unix time}, ...]) and deleted by
+collect_garbage once retired for longer than a grace period; besides
+running after each compaction, collect_all_garbage is run periodically
+(app.session_lifecycle).
+
+Indexes written before manifests existed (a bare `index.faiss`) are read
+as a single-segment store and upgraded on their next write.
+
+A store marked "shared" (one per deduplicated document, see doc_store) is
+frozen; other manifests may list its segment files ("../docs/...") so the
+same vectors are searchable from many indexes without being copied.
+Compacting an index merges such segments into its own base like any other.
+
+Deleting chunks (delete_vectors) tombstones their ids in the manifest
+("tombstones": [[start, stop], ...]); searches skip them at once, and the
+next compaction drops them physically. Vector ids never change: a base
+segment with holes lists the id of each of its vectors in a sidecar file
+("ids": "index.faiss.seg/base-....ids.npy").
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:          # Windows
+    fcntl = None
+    import msvcrt
+
+import faiss
+import numpy as np
+
+from .index_cache import get_index_cache
+from .chunk_store import (
+    chunk_store_path, append_chunks, copy_chunks, delete_chunks, find_chunk_ids,
+    load_filter_columns
+)
+from .vector_store import (
+    build_index, choose_codec, choose_index_kind, maybe_rebuild_index,
+    load_faiss_cached, search_index
+)
+
+
+# -----------------------------
+# Config
+# -----------------------------
+COMPACT_MAX_SEGMENTS = int(os.getenv("FAISS_COMPACT_MAX_SEGMENTS", "8"))
+GC_GRACE_SECONDS = int(os.getenv("FAISS_GC_GRACE_SECONDS", "300"))
+# Compact once this fraction of an index's vectors is deleted
+COMPACT_GARBAGE_RATIO = float(os.getenv("FAISS_COMPACT_GARBAGE_RATIO", "0.2"))
+SEARCH_RETRIES = 3
+
+
+def manifest_path(index_path: str) -> str:
+    return index_path + ".manifest"
+
+
+def segment_dir(index_path: str) -> str:
+    return index_path + ".seg"
+
+
+def store_exists(index_path: str) -> bool:
+    return os.path.exists(manifest_path(index_path)) or os.path.exists(index_path)
+
+
+def list_stores(base_dir: str) -> list:
+    """index_path of every store under base_dir (manifest-based or legacy)."""
+    paths = set()
+    for root, dirs, files in os.walk(base_dir):
+        dirs[:] = [d for d in dirs if not d.endswith(".seg")]
+        for name in files:
+            if name.endswith(".faiss.manifest"):
+                paths.add(os.path.join(root, name[:-len(".manifest")]))
+            elif name.endswith(".faiss"):
+                paths.add(os.path.join(root, name))
+    return sorted(paths)
+
+
+def store_bytes(index_path: str) -> int:
+    """On-disk size of the segments referenced by the current manifest."""
+    return sum(
+        os.path.getsize(_segment_path(index_path, s))
+        + (os.path.getsize(_ids_path(index_path, s)) if "ids" in s else 0)
+        for s in read_manifest(index_path)["segments"]
+    )
+
+
+# -----------------------------
+# Manifest
+# -----------------------------
+def read_manifest(index_path: str) -> dict:
+    """
+    Current manifest. Always read from disk: it is tiny, and mtime-based
+    caching cannot tell apart two rewrites by different workers within
+    the same filesystem timestamp tick.
+    """
+    path = manifest_path(index_path)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+
+    if os.path.exists(index_path):
+        # Legacy single-file index
+        ntotal = load_faiss_cached(index_path).ntotal
+        return {
+            "version": 0,
+            "next_id": ntotal,
+            "segments": [{"file": os.path.basename(index_path), "start": 0, "count": ntotal}],
+        }
+
+    return {"version": 0, "next_id": 0, "segments": []}
+
+
+def _write_manifest(index_path: str, manifest: dict):
+    path = manifest_path(index_path)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)   # atomic: readers see the old or the new version
+
+
+def _segment_path(index_path: str, seg: dict) -> str:
+    # normpath: shared segments are referenced as "../docs/..." and must map
+    # to one cache entry whichever index references them
+    return os.path.normpath(os.path.join(os.path.dirname(index_path), seg["file"]))
+
+
+def _ids_path(index_path: str, seg: dict) -> str:
+    return os.path.normpath(os.path.join(os.path.dirname(index_path), seg["ids"]))
+
+
+def segment_files(index_path: str, manifest: dict = None) -> set:
+    """Normalized paths of the segment and id files a manifest references."""
+    manifest = manifest or read_manifest(index_path)
+    files = set()
+    for seg in manifest["segments"]:
+        files.add(_segment_path(index_path, seg))
+        if "ids" in seg:
+            files.add(_ids_path(index_path, seg))
+    return files
+
+
+def _read_ids(path: str):
+    ids = np.load(path)
+    ids.flags.writeable = False   # shared between requests
+    return ids, ids.nbytes
+
+
+def _segment_ids(index_path: str, seg: dict) -> np.ndarray:
+    """Vector id of each position in a segment."""
+    if "ids" not in seg:
+        return np.arange(seg["start"], seg["start"] + seg["count"])
+    return get_index_cache().get_or_load(_ids_path(index_path, seg), _read_ids)
+
+
+def _dead_mask(manifest: dict, size: int):
+    """Boolean mask over vector ids [0, size) of tombstoned ids, or None."""
+    tombstones = manifest.get("tombstones")
+    if not tombstones:
+        return None
+    dead = np.zeros(size, dtype=bool)
+    for start, stop in tombstones:
+        dead[start:stop] = True
+    return dead
+
+
+def garbage_ratio(manifest: dict) -> float:
+    """Fraction of the vectors in an index's segments that are tombstoned."""
+    total = sum(s["count"] for s in manifest["segments"])
+    dead = sum(stop - start for start, stop in manifest.get("tombstones", []))
+    return dead / total if total else 0.0
+
+
+def _id_ranges(ids) -> list:
+    """Sorted ids as [start, stop) ranges."""
+    ranges = []
+    for i in sorted(ids):
+        if ranges and ranges[-1][1] == i:
+            ranges[-1][1] = i + 1
+        else:
+            ranges.append([i, i + 1])
+    return ranges
+
+
+def _write_ids(index_path: str, ids: np.ndarray, name: str) -> str:
+    """Write an immutable id sidecar file; returns its manifest-relative name."""
+    path = os.path.join(segment_dir(index_path), name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, ids.astype("int64"))
+    os.replace(tmp_path, path)
+    return os.path.relpath(path, os.path.dirname(index_path))
+
+
+def _write_segment(index_path: str, index, name: str) -> str:
+    """Write an immutable segment file; returns its manifest-relative name."""
+    seg_dir = segment_dir(index_path)
+    os.makedirs(seg_dir, exist_ok=True)
+    path = os.path.join(seg_dir, name)
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+    return os.path.relpath(path, os.path.dirname(index_path))
+
+
+# -----------------------------
+# Writes
+# -----------------------------
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+class writer_lock:
+    """
+    Single-writer lock for one index, across threads and worker processes.
+
+    Held while a manifest is read-modified-written (appends, compaction
+    publish), so concurrent uploads can never drop each other's segments.
+    Readers never take it: they only ever see complete, atomically
+    renamed manifests and segment files.
+    """
+
+    def __init__(self, index_path: str):
+        self.lock_path = index_path + ".lock"
+        with _thread_locks_guard:
+            self._thread_lock = _thread_locks.setdefault(
+                os.path.abspath(index_path), threading.Lock()
+            )
+        self._fh = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+            self._fh = open(self.lock_path, "a+b")
+            if fcntl:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+            else:
+                while True:
+                    try:
+                        self._fh.seek(0)
+                        msvcrt.locking(self._fh.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue   # LK_LOCK gives up after ~10s; keep waiting
+        except BaseException:
+            if self._fh:
+                self._fh.close()
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            else:
+                self._fh.seek(0)
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._fh.close()
+            self._thread_lock.release()
+
+
+def append_vectors(index_path: str, vectors: np.ndarray, metadatas: list) -> range:
+    """
+    Add normalized vectors and their chunk metadata as a new segment.
+    Returns the vector ids assigned to them.
+    """
+    with writer_lock(index_path):
+        manifest = read_manifest(index_path)
+        start = manifest["next_id"]
+        version = manifest["version"] + 1
+
+        # 1. chunk rows (invisible until a manifest references their ids)
+        append_chunks(chunk_store_path(index_path), start, metadatas)
+
+        # 2. immutable segment file
+        segment = build_index(vectors, "flat", choose_codec(len(vectors)))
+        name = _write_segment(index_path, segment, f"{version:06d}.idx")
+
+        # 3. publish
+        segments = manifest["segments"] + [{"file": name, "start": start, "count": len(vectors)}]
+        _write_manifest(index_path, dict(
+            manifest,
+            version=version,
+            next_id=start + len(vectors),
+            segments=segments,
+        ))
+
+    if len(segments) > COMPACT_MAX_SEGMENTS:
+        schedule_compaction(index_path)
+    return range(start, start + len(vectors))
+
+
+def compact(index_path: str, codec: str = None) -> dict:
+    """
+    Merge all segments into a single base segment (re-encoded with `codec`
+    if given, and switched to an approximate index type once large enough),
+    leaving out tombstoned vectors.
+    """
+    manifest = read_manifest(index_path)
+    segments = manifest["segments"]
+    tombstones = manifest.get("tombstones", [])
+    if manifest.get("shared") or not segments or (
+            len(segments) == 1 and codec is None and not tombstones):
+        return manifest   # shared stores are referenced by other indexes; never rewritten
+
+    merged_until = manifest["next_id"]
+    dead = _dead_mask(manifest, merged_until)
+    try:
+        ids = np.concatenate([_segment_ids(index_path, seg) for seg in segments])
+        if dead is None:
+            base = faiss.read_index(_segment_path(index_path, segments[0]))   # private, writable copy
+            for seg in segments[1:]:
+                index = load_faiss_cached(_segment_path(index_path, seg))
+                base.add(index.reconstruct_n(0, index.ntotal))
+        else:
+            vectors = []
+            for seg in segments:
+                index = load_faiss_cached(_segment_path(index_path, seg))
+                vectors.append(index.reconstruct_n(0, index.ntotal))
+            live = ~dead[ids]
+            ids, vectors = ids[live], np.vstack(vectors)[live]
+            base = None
+            if len(ids):
+                base = build_index(vectors, choose_index_kind(len(ids)), choose_codec(len(ids), codec))
+    except (FileNotFoundError, RuntimeError):
+        # Another worker compacted and collected these segments first
+        latest = read_manifest(index_path)
+        if latest["segments"][:len(segments)] == segments:
+            raise
+        return latest
+
+    # Unique name: other workers may be compacting the same manifest version
+    stem = f"base-{manifest['version'] + 1:06d}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    written = []
+    if base is not None:
+        base = maybe_rebuild_index(base, codec=codec)
+        base_seg = {"file": _write_segment(index_path, base, f"{stem}.idx"),
+                    "start": 0, "count": base.ntotal}
+        written.append(_segment_path(index_path, base_seg))
+        if not np.array_equal(ids, np.arange(len(ids))):
+            base_seg["ids"] = _write_ids(index_path, ids, f"{stem}.ids.npy")
+            written.append(_ids_path(index_path, base_seg))
+
+    with writer_lock(index_path):
+        latest = read_manifest(index_path)
+        if latest["segments"][:len(segments)] != segments:
+            # Another worker compacted these segments first
+            for path in written:
+                os.remove(path)
+            return latest
+
+        # Keep any segment appended, and any id deleted, while we were merging
+        newer = [s for s in latest["segments"] if s["start"] >= merged_until]
+        pending = [t for t in latest.get("tombstones", []) if t not in tombstones]
+        # Superseded files of this store (not shared ones it references)
+        retired = latest.get("retired", []) + [
+            {"file": name, "at": time.time()}
+            for seg in segments for name in (seg["file"], seg.get("ids"))
+            if name and _owns(index_path, os.path.join(os.path.dirname(index_path), name))
+        ]
+
+        new_manifest = {
+            "version": latest["version"] + 1,
+            "next_id": latest["next_id"],
+            "segments": ([base_seg] if base is not None else []) + newer,
+        }
+        if pending:
+            new_manifest["tombstones"] = pending
+        if retired:
+            new_manifest["retired"] = retired
+        _write_manifest(index_path, new_manifest)
+    print(f"🗜️ Compacted {len(segments)} segments of {index_path} "
+          f"({len(ids)} vectors, {int(dead.sum()) if dead is not None else 0} deleted)")
+    collect_garbage(index_path)
+    return new_manifest
+
+
+def mark_shared(index_path: str) -> dict:
+    """
+    Freeze a store so other indexes can reference its segment files
+    (see attach_shared): it is compacted to one segment first and is never
+    compacted or garbage collected afterwards.
+    """
+    compact(index_path)
+    with writer_lock(index_path):
+        manifest = read_manifest(index_path)
+        manifest = dict(manifest, version=manifest["version"] + 1, shared=True)
+        _write_manifest(index_path, manifest)
+    return manifest
+
+
+def attach_shared(index_path: str, shared_path: str, overrides: dict) -> range:
+    """
+    Make the vectors of a shared store (see mark_shared) searchable in
+    `index_path` without copying them: the manifest references the shared
+    segment files, and only the chunk rows are copied (with `overrides`
+    applied, e.g. owner and source name). Returns the ids assigned.
+    """
+    shared = read_manifest(shared_path)
+    if not shared.get("shared"):
+        raise ValueError(f"{shared_path} is not a shared store")
+
+    with writer_lock(index_path):
+        manifest = read_manifest(index_path)
+        start = manifest["next_id"]
+
+        copy_chunks(chunk_store_path(shared_path), chunk_store_path(index_path), start, overrides)
+
+        index_dir = os.path.dirname(index_path)
+        segments = manifest["segments"] + [
+            {"file": os.path.relpath(_segment_path(shared_path, seg), index_dir),
+             "start": start + seg["start"], "count": seg["count"]}
+            for seg in shared["segments"]
+        ]
+        _write_manifest(index_path, dict(
+            manifest,
+            version=manifest["version"] + 1,
+            next_id=start + shared["next_id"],
+            segments=segments,
+        ))
+
+    if len(segments) > COMPACT_MAX_SEGMENTS:
+        schedule_compaction(index_path)
+    return range(start, start + shared["next_id"])
+
+
+def delete_vectors(index_path: str, **match) -> int:
+    """
+    Delete every chunk whose columns equal `match` (e.g. doc_id=12): its
+    id is tombstoned, so searches skip it at once, and its chunk row is
+    removed. Compaction, which drops the vectors themselves, is scheduled
+    once COMPACT_GARBAGE_RATIO of the index is dead.
+    Returns the number of chunks deleted.
+    """
+    with writer_lock(index_path):
+        manifest = read_manifest(index_path)
+        db_path = chunk_store_path(index_path)
+        ids = [i for i in find_chunk_ids(db_path, **match) if i < manifest["next_id"]]
+        if not ids:
+            return 0
+
+        # Tombstones first: if the row delete is interrupted, a retry finds
+        # the rows again and search never returns a vector without its row
+        manifest = dict(
+            manifest,
+            version=manifest["version"] + 1,
+            tombstones=manifest.get("tombstones", []) + _id_ranges(ids),
+        )
+        _write_manifest(index_path, manifest)
+        delete_chunks(db_path, ids)
+
+    ratio = garbage_ratio(manifest)
+    print(f"🗑️ Deleted {len(ids)} chunks from {index_path} ({ratio:.0%} of the index is garbage)")
+    if ratio >= COMPACT_GARBAGE_RATIO:
+        schedule_compaction(index_path)
+    return len(ids)
+
+
+def store_files(index_path: str) -> list:
+    """
+    Every file of a store: manifest, own segments and id sidecars, chunk
+    store (and its journals), legacy index and metadata. Shared segments
+    it references belong to their document store and are not listed.
+    """
+    directory, name = os.path.split(index_path)
+    paths = []
+    if os.path.isdir(directory):
+        for entry in os.listdir(directory):
+            if entry == name or (entry.startswith(name + ".")
+                                 and not entry.endswith((".lock", ".seg", ".cold.tar.gz"))):
+                paths.append(os.path.join(directory, entry))
+    seg_dir = segment_dir(index_path)
+    if os.path.isdir(seg_dir):
+        paths.extend(os.path.join(seg_dir, entry) for entry in os.listdir(seg_dir))
+    return paths
+
+
+def delete_store(index_path: str) -> int:
+    """
+    Delete a store and all its files. The manifest goes first, so readers
+    see an empty store rather than one with missing segments.
+    Returns the number of files removed.
+    """
+    with writer_lock(index_path):
+        return remove_store_files(index_path)
+
+
+def remove_store_files(index_path: str) -> int:
+    """delete_store for a caller already holding the store's writer_lock."""
+    paths = store_files(index_path)
+    manifest = manifest_path(index_path)
+    paths.sort(key=lambda path: path != manifest)
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        get_index_cache().invalidate(path)
+    try:
+        os.rmdir(segment_dir(index_path))
+    except OSError:
+        pass   # absent, or a compaction is still writing into it
+    # The empty .lock file stays: the caller holds it, and a writer blocked
+    # on the old inode would otherwise run alongside one locking a new file
+    return len(paths)
+
+
+_compacting = set()
+_compacting_lock = threading.Lock()
+
+
+def schedule_compaction(index_path: str):
+    """Run compact() in a background thread (at most one per index)."""
+    with _compacting_lock:
+        if index_path in _compacting:
+            return
+        _compacting.add(index_path)
+
+    def run():
+        try:
+            compact(index_path)
+        except Exception as e:
+            print(f"⚠️ Compaction of {index_path} failed: {e}")
+        finally:
+            with _compacting_lock:
+                _compacting.discard(index_path)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def _owns(index_path: str, path: str) -> bool:
+    """True for the store's own segment files and legacy base (not shared segments)."""
+    path = os.path.normpath(path)
+    return (path == os.path.normpath(index_path)
+            or os.path.dirname(path) == os.path.normpath(segment_dir(index_path)))
+
+
+def collect_garbage(index_path: str, grace_seconds: int = GC_GRACE_SECONDS) -> int:
+    """
+    Delete the store's files no manifest references any more: files retired
+    by compaction once retired for longer than the grace period (readers
+    that picked up an older manifest may still be loading them), and stray
+    files (e.g. from an interrupted compaction) once older than it.
+    Returns the number of files deleted.
+    """
+    if not os.path.exists(manifest_path(index_path)):
+        return 0
+    now = time.time()
+    directory = os.path.dirname(index_path)
+
+    with writer_lock(index_path):
+        manifest = read_manifest(index_path)
+        live = segment_files(index_path, manifest)
+        retired = manifest.get("retired", [])
+        due = [r for r in retired if now - r["at"] >= grace_seconds]
+        pending = {os.path.normpath(os.path.join(directory, r["file"])) for r in retired if r not in due}
+
+        seg_dir = segment_dir(index_path)
+        candidates = [os.path.join(seg_dir, n) for n in os.listdir(seg_dir)] if os.path.isdir(seg_dir) else []
+        candidates.append(index_path)   # legacy base
+        doomed = {os.path.normpath(os.path.join(directory, r["file"])) for r in due}
+        for candidate in map(os.path.normpath, candidates):
+            if (candidate not in live and candidate not in pending and os.path.isfile(candidate)
+                    and now - os.path.getmtime(candidate) >= grace_seconds):
+                doomed.add(candidate)
+        doomed -= live
+
+        for path in doomed:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            get_index_cache().invalidate(path)
+        if due:
+            # Same searchable content: the version is not bumped
+            manifest = {key: value for key, value in manifest.items() if key != "retired"}
+            if len(due) < len(retired):
+                manifest["retired"] = [r for r in retired if r not in due]
+            _write_manifest(index_path, manifest)
+    return len(doomed)
+
+
+def collect_all_garbage(base_dir: str, grace_seconds: int = GC_GRACE_SECONDS) -> int:
+    """collect_garbage for every store under base_dir. Returns the number of files deleted."""
+    deleted = sum(collect_garbage(path, grace_seconds) for path in list_stores(base_dir))
+    if deleted:
+        print(f"🧹 Deleted {deleted} superseded index files under {base_dir}")
+    return deleted
+
+
+# -----------------------------
+# Reads
+# -----------------------------
+def read_vectors(index_path: str) -> np.ndarray:
+    """
+    Every searchable vector of a store (its manifest's segments, shared and
+    legacy ones included, tombstoned ids left out), in id order. Vectors of
+    a compressed codec come back decoded, i.e. approximate.
+    """
+    manifest = read_manifest(index_path)
+    if not manifest["segments"]:
+        raise ValueError(f"{index_path} holds no vectors")
+    ids, vectors = [], []
+    for seg in manifest["segments"]:
+        index = load_faiss_cached(_segment_path(index_path, seg))
+        ids.append(_segment_ids(index_path, seg))
+        vectors.append(index.reconstruct_n(0, index.ntotal))
+    ids, vectors = np.concatenate(ids), np.vstack(vectors)
+    dead = _dead_mask(manifest, manifest["next_id"])
+    if dead is not None:
+        ids, vectors = ids[~dead[ids]], vectors[~dead[ids]]
+    return vectors[np.argsort(ids, kind="stable")]
+
+
+def _bitmap_selector(mask: np.ndarray):
+    bitmap = np.packbits(mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+    selector.bitmap_ref = bitmap   # keep the buffer alive as long as the selector
+    return selector
+
+
+def filter_mask(index_path: str, size: int, **filters):
+    """
+    Boolean mask over vector ids [0, size) of chunks matching the academic
+    filters, or None when no filter is active.
+    Chunks with no value for a field match any filter on it.
+    """
+    active = {f: v for f, v in filters.items() if v}
+    if not active:
+        return None
+
+    columns = load_filter_columns(chunk_store_path(index_path), min_size=size)
+    mask = np.ones(size, dtype=bool)
+    for field, value in active.items():
+        col = columns[field][:size]
+        mask[:len(col)] &= (col == "") | (col == str(value))
+    return mask
+
+
+def search(index_path: str, query_vec: np.ndarray, k: int, **filters):
+    """
+    Top-k (score, vector_id) pairs across all segments of the current
+    manifest, restricted to chunks matching `filters`.
+    """
+    for attempt in range(SEARCH_RETRIES):
+        manifest = read_manifest(index_path)
+        try:
+            return _search_manifest(index_path, manifest, query_vec, k, filters)
+        except (FileNotFoundError, RuntimeError):
+            # A segment of the manifest we read was compacted away and
+            # collected in the meantime; retry only if the manifest moved on.
+            if attempt == SEARCH_RETRIES - 1 or read_manifest(index_path) == manifest:
+                raise
+
+
+def _search_manifest(index_path: str, manifest: dict, query_vec: np.ndarray, k: int, filters: dict):
+    mask = filter_mask(index_path, manifest["next_id"], **filters)
+    dead = _dead_mask(manifest, manifest["next_id"])
+    if dead is not None:
+        mask = ~dead if mask is None else mask & ~dead
+
+    hits = []
+    for seg in manifest["segments"]:
+        start, count = seg["start"], seg["count"]
+        ids = _segment_ids(index_path, seg) if "ids" in seg else None
+        selector, n_matching = None, count
+        if mask is not None:
+            seg_mask = mask[ids] if ids is not None else mask[start:start + count]
+            n_matching = int(seg_mask.sum())
+            if n_matching == 0:
+                continue
+            if n_matching < count:
+                selector = _bitmap_selector(seg_mask)
+
+        index = load_faiss_cached(_segment_path(index_path, seg))
+        scores, found = search_index(index, query_vec, min(k, n_matching),
+                                   selector, n_matching=n_matching)
+        hits.extend(
+            (float(score), int(ids[i]) if ids is not None else start + int(i))
+            for score, i in zip(scores[0], found[0]) if i >= 0
+        )
+
+    hits.sort(key=lambda h: h[0], reverse=True)
+    return hits[:k]
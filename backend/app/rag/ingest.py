@@ -2,16 +2,23 @@ import os
 import io
 import re
 import tempfile
-from typing import List, Tuple
-
-from PyPDF2 import PdfReader
-import pytesseract
-from pdf2image import convert_from_path
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Tuple
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-# ⚠️ Update this path if needed (Windows only)
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+from . import ocr
+from .pdf_backends import open_pdf, PDF_BACKEND
+
+# Parallel text extraction: pages are handed to worker processes in
+# ranges of at most PDF_EXTRACT_PAGES_PER_TASK (PyPDF2 is pure Python and
+# CPU-bound, OCR more so). PDF_EXTRACT_WORKERS=0 extracts in the caller.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_EXTRACT_PAGES_PER_TASK = int(os.getenv("PDF_EXTRACT_PAGES_PER_TASK", "16"))
 
 
 # -----------------------------
@@ -21,98 +28,236 @@ LAB_LINE = re.compile(
     r"([A-Za-z\s]+)\s*[:\-]\s*([\d\.]+)\s*([a-zA-Z/%]+)?",
     re.IGNORECASE
 )
+# Same yes/no answer as LAB_LINE.search(), in linear time: since \s is part
+# of [A-Za-z\s], a match only needs one such char right before ":" / "-".
+# LAB_LINE backtracks quadratically on long lines without a separator.
+_LAB_LINE_TEST = re.compile(r"[A-Za-z\s][:\-]\s*[\d\.]", re.IGNORECASE)
 
 
 # -----------------------------
 # Extract text from PDF (OCR fallback)
 # -----------------------------
-def extract_text_from_pdf(pdf_path: str) -> Tuple[List[str], List[dict]]:
-    reader = PdfReader(pdf_path)
-    texts, metadata = [], []
+def count_pdf_pages(pdf_path: str, backend: str = None) -> int:
+    doc = open_pdf(pdf_path, backend)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
 
-    for page_num, page in enumerate(reader.pages):
-        try:
-            text = page.extract_text()
-            if text and text.strip():
-                texts.append(text)
-                metadata.append({"page": page_num, "ocr": False})
-            else:
-                # Skip OCR if no text found
-                texts.append("[No text extracted from this page]")
-                metadata.append({"page": page_num, "ocr": False})
-        except Exception as e:
-            texts.append(f"[Error extracting text: {str(e)}]")
-            metadata.append({"page": page_num, "ocr": False})
 
-    return texts, metadata
+def _ocr_fallback(pdf_path: str, file_hash: str, page_num: int) -> str:
+    if not ocr.OCR_ENABLED or file_hash is None:
+        return ""
+    try:
+        return ocr.ocr_page_cached(pdf_path, file_hash, page_num)
+    except Exception as e:
+        # Tesseract / poppler missing or a broken page image
+        print(f"⚠️ OCR failed for page {page_num} of {pdf_path}: {e}")
+        return ""
 
 
-# -----------------------------
-# Domain-aware chunking (from your project)
-# -----------------------------
-def study_aware_chunking(text: str) -> List[str]:
-    lines = text.split("\n")
-    buffer, chunks = [], []
+def _extract_page(doc, page_num: int,
+                  pdf_path: str, file_hash: str) -> Tuple[str, dict]:
+    try:
+        text = doc.page_text(page_num)
+        if text and text.strip():
+            return text, {"page": page_num, "ocr": False}
+
+        # No text layer (scanned page): OCR it
+        text = _ocr_fallback(pdf_path, file_hash, page_num)
+        if text.strip():
+            return text, {"page": page_num, "ocr": True}
+        return "[No text extracted from this page]", {"page": page_num, "ocr": False}
+    except Exception as e:
+        return f"[Error extracting text: {str(e)}]", {"page": page_num, "ocr": False}
+
+
+def _extract_page_range(pdf_path: str, backend: str, file_hash: str,
+                        start: int, stop: int) -> List[Tuple[str, dict]]:
+    # Runs in a worker process: each task opens its own document
+    doc = open_pdf(pdf_path, backend)
+    try:
+        return [_extract_page(doc, page_num, pdf_path, file_hash)
+                for page_num in range(start, stop)]
+    finally:
+        doc.close()
 
-    for line in lines:
-        buffer.append(line)
 
-        if LAB_LINE.search(line):
-            continue
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
 
-        if len(" ".join(buffer)) > 700:
-            chunks.append(" ".join(buffer))
-            buffer = []
 
-    if buffer:
-        chunks.append(" ".join(buffer))
+def _get_extract_pool() -> ProcessPoolExecutor:
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            # spawn: forking a server process that already runs threads is unsafe
+            _extract_pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _extract_pool
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=150
-    )
 
-    final_chunks = []
-    for chunk in chunks:
-        final_chunks.extend(splitter.split_text(chunk))
+def _reset_extract_pool():
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is not None:
+            _extract_pool.shutdown(wait=False, cancel_futures=True)
+        _extract_pool = None
 
-    return final_chunks
+
+def iter_pdf_pages(pdf_path: str, start_page: int = 0,
+                   backend: str = None) -> Iterator[Tuple[str, dict]]:
+    """
+    Yield (text, metadata) one page at a time, in page order, starting at
+    `start_page`. Page ranges are extracted in parallel across
+    PDF_EXTRACT_WORKERS processes, with at most two ranges per worker in
+    flight so a large PDF is never held in memory at once. Pages without
+    a text layer are OCRed in the same workers; a short PDF is split
+    into smaller ranges so a scanned handout is OCRed by all of them.
+    `backend` overrides PDF_BACKEND (see pdf_backends).
+    """
+    backend = backend or PDF_BACKEND
+    total = count_pdf_pages(pdf_path, backend)
+    file_hash = ocr.file_sha256(pdf_path) if ocr.OCR_ENABLED else None
+
+    if PDF_EXTRACT_WORKERS <= 0:
+        doc = open_pdf(pdf_path, backend)
+        try:
+            for page_num in range(start_page, total):
+                yield _extract_page(doc, page_num, pdf_path, file_hash)
+        finally:
+            doc.close()
+        return
+
+    per_task = -(-(total - start_page) // PDF_EXTRACT_WORKERS)   # ceil
+    per_task = max(1, min(PDF_EXTRACT_PAGES_PER_TASK, per_task))
+    ranges = [
+        (start, min(start + per_task, total))
+        for start in range(start_page, total, per_task)
+    ]
+
+    pool = _get_extract_pool()
+    pending = deque()
+    try:
+        for start, stop in ranges:
+            pending.append(pool.submit(_extract_page_range, pdf_path, backend, file_hash, start, stop))
+            if len(pending) >= 2 * PDF_EXTRACT_WORKERS:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    except BrokenProcessPool:
+        _reset_extract_pool()   # a worker died (e.g. OOM); start fresh next time
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
 
 
 # -----------------------------
-# Main ingestion function
+# Domain-aware chunking (from your project)
 # -----------------------------
-def ingest_pdf(
-    pdf_path: str,
-    owner_type: str,          # "faculty" or "student"
-    owner_id: int | None,      # None for faculty, user_id for student
-    session_id: int | None    # None for faculty, session_id for student
-) -> Tuple[List[str], List[dict]]:
+CHUNK_FLUSH_CHARS = 700     # a block is closed once it passes this length
+# Let a block continue onto the next page instead of closing it at every
+# page break (the chunk then records the page span it covers)
+CHUNK_ACROSS_PAGES = os.getenv("CHUNK_ACROSS_PAGES", "0") == "1"
+
+_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=800,
+    chunk_overlap=150
+)
+
+
+class StudyChunker:
     """
-    Extracts text, chunks it, and attaches metadata.
+    Streaming study-aware chunker. Lines are buffered into blocks of about
+    CHUNK_FLUSH_CHARS characters; a block never ends right after a
+    lab-style "name: value unit" line, so readings stay with the lines
+    that follow them. Each block is then split with a shared
+    RecursiveCharacterTextSplitter.
+
+    Feed pages in order with add_page() and call finish() at the end;
+    both return (chunk, page_meta) pairs. Block lengths are tracked
+    incrementally and lab lines are detected with a linear-time pattern,
+    so chunking is linear in the text size.
     """
 
-    texts, metas = extract_text_from_pdf(pdf_path)
+    def __init__(self, across_pages: bool = False):
+        self.across_pages = across_pages
+        self._buffer = []
+        self._length = 0            # == len(" ".join(self._buffer))
+        self._metas = []            # metadata of the pages in the buffer
+
+    @property
+    def pending_page(self):
+        """First page with text still buffered (not yet emitted), or None."""
+        return self._metas[0]["page"] if self._buffer else None
+
+    def add_page(self, text: str, meta: dict) -> List[Tuple[str, dict]]:
+        if not self._buffer:
+            self._metas = [meta]
+        elif self._metas[-1] is not meta:
+            self._metas.append(meta)
+
+        out = []
+        for line in text.split("\n"):
+            self._length += len(line) + (1 if self._buffer else 0)
+            self._buffer.append(line)
+
+            if _LAB_LINE_TEST.search(line):
+                continue
+
+            if self._length > CHUNK_FLUSH_CHARS:
+                out.extend(self._flush())
+                self._metas = [meta]
+
+        if not self.across_pages:
+            out.extend(self._flush())
+        return out
+
+    def finish(self) -> List[Tuple[str, dict]]:
+        return self._flush()
 
+    def _flush(self) -> List[Tuple[str, dict]]:
+        if not self._buffer:
+            self._metas = []
+            return []
+        meta = dict(self._metas[0])
+        if len(self._metas) > 1:
+            meta["page_end"] = self._metas[-1]["page"]
+            meta["ocr"] = any(m["ocr"] for m in self._metas)
+        block = " ".join(self._buffer)
+        self._buffer, self._length, self._metas = [], 0, []
+        return [(chunk, meta) for chunk in _splitter.split_text(block)]
+
+
+def study_aware_chunking(text: str) -> List[str]:
+    chunker = StudyChunker()
+    return [chunk for chunk, _ in chunker.add_page(text, {"page": 0, "ocr": False})]
+
+
+# -----------------------------
+# Chunk extracted pages
+# -----------------------------
+def clean_source_name(pdf_path: str) -> str:
     # Strip UUID prefix for clean citation names.
     # Files are saved as "{uuid}_{original_filename}"; UUID is 36 chars with dashes.
     basename = os.path.basename(pdf_path)
     parts = basename.split("_", 1)
-    clean_source = parts[1] if len(parts) == 2 and len(parts[0]) == 36 else basename
-
-    all_chunks, all_metadata = [], []
-
-    for text, meta in zip(texts, metas):
-        chunks = study_aware_chunking(text)
-        for chunk in chunks:
-            all_chunks.append(chunk)
-            all_metadata.append({
-                "owner_type": owner_type,
-                "owner_id": owner_id,
-                "session_id": session_id,
-                "page": meta["page"],
-                "ocr": meta["ocr"],
-                "source": clean_source
-            })
-
-    return all_chunks, all_metadata
+    return parts[1] if len(parts) == 2 and len(parts[0]) == 36 else basename
+
+
+def chunk_metadata(page_meta: dict, source: str, owner_type: str,
+                   owner_id: int | None, session_id: int | None) -> dict:
+    meta = {
+        "owner_type": owner_type,
+        "owner_id": owner_id,
+        "session_id": session_id,
+        "page": page_meta["page"],
+        "ocr": page_meta["ocr"],
+        "source": source
+    }
+    if "page_end" in page_meta:
+        meta["page_end"] = page_meta["page_end"]
+    return meta
@@ -0,0 +1,330 @@
+"""
+Shared gateway in front of the Groq model.
+
+Every LLM call (chat answers, study answers, titles) goes through one
+LLMGateway:
+
+- at most LLM_MAX_IN_FLIGHT calls run at once; the rest wait in a queue,
+- queued chat answers go before titles ("answer" before "title"),
+- within a priority, users are served round-robin, so one user with many
+  queued calls cannot starve the others,
+- a 429 from the API pauses every call (Retry-After if given, else
+  exponential backoff with jitter) and the call is retried up to
+  LLM_MAX_RETRIES times; the Groq client's own retries are turned off.
+
+Callers say who they are with llm_request():
+
+    with llm_request(user_id, "title"):
+        await llm.ainvoke(prompt)
+
+Queue depth, in-flight count and wait times are in get_llm_gateway().stats().
+"""
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+# -----------------------------
+# Config
+# -----------------------------
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+
+PRIORITIES = ("answer", "title")   # served in this order
+
+
+# -----------------------------
+# Who is calling
+# -----------------------------
+_request = contextvars.ContextVar("llm_request", default=(None, "answer"))
+
+
+@contextmanager
+def llm_request(user_id=None, priority: str = "answer"):
+    """Attribute the LLM calls made inside the block to user_id, at priority."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority: {priority}")
+    token = _request.set((user_id, priority))
+    try:
+        yield
+    finally:
+        try:
+            _request.reset(token)
+        except ValueError:
+            pass   # an abandoned stream closed from another context
+
+
+# -----------------------------
+# Rate limit errors
+# -----------------------------
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def retry_after(error: Exception):
+    """Seconds from the Retry-After header of a 429, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Waiter:
+    """A queued call; woken from whichever thread frees a slot."""
+
+    def __init__(self, user_id, loop=None):
+        self.user_id = user_id
+        self.queued_at = time.monotonic()
+        self.granted = False
+        self.loop = loop
+        if loop is not None:
+            self.future = loop.create_future()
+        else:
+            self.event = threading.Event()
+
+    def wake(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._resolve)
+        else:
+            self.event.set()
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class LLMGateway:
+    """
+    Thread-safe in-flight limit with priority + per-user round-robin
+    queuing, usable from both sync code and the event loop.
+    """
+
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base: float = LLM_BACKOFF_BASE_SECONDS,
+                 backoff_max: float = LLM_BACKOFF_MAX_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        # priority -> OrderedDict(user_id -> deque of waiters); the user
+        # at the front is served next, then moves to the back
+        self._queues = {p: OrderedDict() for p in PRIORITIES}
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._waits_ms = deque(maxlen=1000)
+        self.calls = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+    # -------- queue --------
+    def _enqueue(self, waiter: _Waiter, priority: str):
+        with self._lock:
+            self._queues[priority].setdefault(waiter.user_id, deque()).append(waiter)
+            self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to the next waiters (lock held)."""
+        while self._in_flight < self.max_in_flight:
+            users = next((q for q in self._queues.values() if q), None)
+            if users is None:
+                return
+            user_id, waiters = next(iter(users.items()))
+            waiter = waiters.popleft()
+            del users[user_id]
+            if waiters:
+                users[user_id] = waiters   # back of the round
+            waiter.granted = True
+            self._in_flight += 1
+            self.calls += 1
+            self._waits_ms.append((time.monotonic() - waiter.queued_at) * 1000)
+            waiter.wake()
+
+    def _withdraw(self, waiter: _Waiter, priority: str):
+        """Forget a cancelled waiter, or free its slot if it was granted meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                self._in_flight -= 1
+                self._dispatch()
+                return
+            users = self._queues[priority]
+            waiters = users.get(waiter.user_id)
+            if waiters is not None:
+                waiters.remove(waiter)
+                if not waiters:
+                    del users[waiter.user_id]
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, user_id=None, priority: str = "answer"):
+        waiter = _Waiter(user_id)
+        self._enqueue(waiter, priority)
+        waiter.event.wait()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, user_id=None, priority: str = "answer"):
+        waiter = _Waiter(user_id, asyncio.get_running_loop())
+        self._enqueue(waiter, priority)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            self._withdraw(waiter, priority)
+            raise
+        try:
+            yield
+        finally:
+            self.release()
+
+    # -------- 429 backoff --------
+    def pause_remaining(self) -> float:
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def backoff(self, error: Exception, attempt: int) -> bool:
+        """
+        On a 429, pause all calls and return True if this one should be
+        retried. Any other error, or the last attempt, returns False.
+        """
+        if not is_rate_limited(error):
+            return False
+        delay = retry_after(error)
+        if delay is None:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+            delay *= random.uniform(0.5, 1.0)
+        with self._lock:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            if attempt >= self.max_retries:
+                return False
+            self.retries += 1
+        print(f"⏳ LLM rate limited, retrying in {delay:.1f}s (attempt {attempt + 1})")
+        return True
+
+    # -------- metrics --------
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits_ms)
+            queued = {p: sum(len(w) for w in q.values()) for p, q in self._queues.items()}
+            return {
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self._in_flight,
+                "queued": queued,
+                "queued_users": len({u for q in self._queues.values() for u in q}),
+                "calls": self.calls,
+                "rate_limited": self.rate_limited,
+                "retries": self.retries,
+                "paused_seconds": round(self.pause_remaining(), 2),
+                "wait_ms": {
+                    "avg": round(sum(waits) / len(waits), 1) if waits else 0.0,
+                    "p50": round(waits[len(waits) // 2], 1) if waits else 0.0,
+                    "p95": round(waits[int(len(waits) * 0.95)], 1) if waits else 0.0,
+                    "max": round(waits[-1], 1) if waits else 0.0,
+                },
+            }
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+
+# -----------------------------
+# Chat model behind the gateway
+# -----------------------------
+class GatedChatModel(BaseChatModel):
+    """
+    Wraps a chat model so every invoke/stream takes a gateway slot and is
+    retried on 429. Drop-in for the wrapped model in `prompt | llm` chains.
+    """
+
+    llm: Any
+    gateway: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return f"gated-{self.llm._llm_type}"
+
+    def _gateway(self) -> LLMGateway:
+        return self.gateway or get_llm_gateway()
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        gateway = self._gateway()
+        with gateway.slot(*_request.get()):
+            for attempt in range(gateway.max_retries + 1):
+                time.sleep(gateway.pause_remaining())
+                try:
+                    message = self.llm.invoke(messages, stop=stop, **kwargs)
+                    return ChatResult(generations=[ChatGeneration(message=message)])
+                except Exception as e:
+                    if not gateway.backoff(e, attempt):
+                        raise
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        gateway = self._gateway()
+        async with gateway.aslot(*_request.get()):
+            for attempt in range(gateway.max_retries + 1):
+                await asyncio.sleep(gateway.pause_remaining())
+                try:
+                    message = await self.llm.ainvoke(messages, stop=stop, **kwargs)
+                    return ChatResult(generations=[ChatGeneration(message=message)])
+                except Exception as e:
+                    if not gateway.backoff(e, attempt):
+                        raise
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        gateway = self._gateway()
+        with gateway.slot(*_request.get()):
+            for attempt in range(gateway.max_retries + 1):
+                time.sleep(gateway.pause_remaining())
+                started = False
+                try:
+                    for chunk in self.llm.stream(messages, stop=stop, **kwargs):
+                        started = True
+                        yield ChatGenerationChunk(message=chunk)
+                    return
+                except Exception as e:
+                    # Tokens already sent cannot be taken back: only retry before the first
+                    if started or not gateway.backoff(e, attempt):
+                        raise
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        gateway = self._gateway()
+        async with gateway.aslot(*_request.get()):
+            for attempt in range(gateway.max_retries + 1):
+                await asyncio.sleep(gateway.pause_remaining())
+                started = False
+                try:
+                    async for chunk in self.llm.astream(messages, stop=stop, **kwargs):
+                        started = True
+                        yield ChatGenerationChunk(message=chunk)
+                    return
+                except Exception as e:
+                    if started or not gateway.backoff(e, attempt):
+                        raise
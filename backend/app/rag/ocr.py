@@ -0,0 +1,102 @@
+"""
+OCR fallback for PDF pages without a text layer (scanned pages).
+
+Pages are rasterized with pdf2image (poppler) and read with Tesseract.
+Results are cached in SQLite keyed by (file sha256, page, dpi, language),
+so re-ingesting the same scan with the same settings never runs OCR
+again. Called from the PDF extraction worker processes, one page at a
+time, only for pages with no extractable text.
+"""
+import hashlib
+import os
+import sqlite3
+
+import pytesseract
+from pdf2image import convert_from_path
+
+
+# -----------------------------
+# Config
+# -----------------------------
+OCR_ENABLED = os.getenv("OCR_ENABLED", "1") == "1"
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "data/ocr_cache.db")
+
+# Tesseract is looked up on PATH unless TESSERACT_CMD points at the binary
+# (e.g. C:\Program Files\Tesseract-OCR\tesseract.exe on Windows)
+_WINDOWS_TESSERACT = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+TESSERACT_CMD = os.getenv("TESSERACT_CMD") or (
+    _WINDOWS_TESSERACT if os.name == "nt" and os.path.exists(_WINDOWS_TESSERACT) else None
+)
+if TESSERACT_CMD:
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+def _connect():
+    os.makedirs(os.path.dirname(OCR_CACHE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(OCR_CACHE_PATH, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS ocr_text ("
+        "file_hash TEXT NOT NULL, page INTEGER NOT NULL, dpi INTEGER NOT NULL, "
+        "lang TEXT NOT NULL, text TEXT NOT NULL, "
+        "PRIMARY KEY (file_hash, page, dpi, lang))"
+    )
+    return conn
+
+
+def get_cached_text(file_hash: str, page_num: int, dpi: int = OCR_DPI, lang: str = OCR_LANG):
+    if not os.path.exists(OCR_CACHE_PATH):
+        return None
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT text FROM ocr_text WHERE file_hash = ? AND page = ? AND dpi = ? AND lang = ?",
+            (file_hash, page_num, dpi, lang)
+        ).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def put_cached_text(file_hash: str, page_num: int, text: str,
+                    dpi: int = OCR_DPI, lang: str = OCR_LANG):
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_text VALUES (?, ?, ?, ?, ?)",
+                (file_hash, page_num, dpi, lang, text)
+            )
+    finally:
+        conn.close()
+
+
+# -----------------------------
+# OCR
+# -----------------------------
+def ocr_page(pdf_path: str, page_num: int, dpi: int = OCR_DPI, lang: str = OCR_LANG) -> str:
+    """Rasterize one page (0-based) and OCR it."""
+    images = convert_from_path(pdf_path, dpi=dpi,
+                               first_page=page_num + 1, last_page=page_num + 1)
+    return "\n".join(pytesseract.image_to_string(image, lang=lang) for image in images)
+
+
+def ocr_page_cached(pdf_path: str, file_hash: str, page_num: int) -> str:
+    """OCR text of a page, from the cache when this file was seen before."""
+    text = get_cached_text(file_hash, page_num, OCR_DPI, OCR_LANG)
+    if text is None:
+        text = ocr_page(pdf_path, page_num, OCR_DPI, OCR_LANG)
+        put_cached_text(file_hash, page_num, text, OCR_DPI, OCR_LANG)
+    return text
@@ -0,0 +1,85 @@
+"""
+PDF text extraction backends.
+
+Every backend opens a file as a document exposing `page_count`,
+`page_text(page_num)` and `close()`; ingestion only talks to that, so the
+extractor is picked with PDF_BACKEND:
+
+    "pypdf2"   PyPDF2 (default, the original extractor)
+    "pypdf"    pypdf (maintained successor of PyPDF2)
+    "pymupdf"  PyMuPDF / fitz (C library, much faster; optional install)
+
+Compare them with `python -m benchmarks.extract_bench`.
+"""
+import os
+
+
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pypdf2")
+
+
+class _ReaderDocument:
+    """pypdf and PyPDF2 share the PdfReader API."""
+
+    def __init__(self, reader):
+        self._reader = reader
+        self.page_count = len(reader.pages)
+
+    def page_text(self, page_num: int) -> str:
+        return self._reader.pages[page_num].extract_text() or ""
+
+    def close(self):
+        pass
+
+
+class _MuPdfDocument:
+    def __init__(self, doc):
+        self._doc = doc
+        self.page_count = doc.page_count
+
+    def page_text(self, page_num: int) -> str:
+        return self._doc.load_page(page_num).get_text()
+
+    def close(self):
+        self._doc.close()
+
+
+def _open_pypdf(pdf_path: str):
+    from pypdf import PdfReader
+    return _ReaderDocument(PdfReader(pdf_path))
+
+
+def _open_pypdf2(pdf_path: str):
+    from PyPDF2 import PdfReader
+    return _ReaderDocument(PdfReader(pdf_path))
+
+
+def _open_pymupdf(pdf_path: str):
+    import fitz   # pip install pymupdf
+    return _MuPdfDocument(fitz.open(pdf_path))
+
+
+BACKENDS = {
+    "pypdf": _open_pypdf,
+    "pypdf2": _open_pypdf2,
+    "pymupdf": _open_pymupdf,
+}
+
+
+def open_pdf(pdf_path: str, backend: str = None):
+    """Open a PDF with the given (or configured) extraction backend."""
+    backend = backend or PDF_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend: {backend} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[backend](pdf_path)
+
+
+def available_backends() -> list:
+    """Backends whose library is installed."""
+    available = []
+    for name, module in (("pypdf", "pypdf"), ("pypdf2", "PyPDF2"), ("pymupdf", "fitz")):
+        try:
+            __import__(module)
+            available.append(name)
+        except ImportError:
+            pass
+    return available
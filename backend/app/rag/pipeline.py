@@ -1,14 +1,20 @@
 import os
 import re
-import numpy as np
-from typing import List
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 from langchain_core.prompts import PromptTemplate
 from langchain_groq import ChatGroq
 
-from .embeddings import get_embeddings
-from .vector_store import create_or_load_faiss
-from .study_llm import study_only_answer
+from .embeddings import embed_query_vector
+from .index_store import store_exists, search
+from .chunk_store import ensure_chunk_store, get_chunks
+from .session_store import thaw
+from .study_llm import study_chain
+from .llm_gateway import GatedChatModel, llm_request
+from .answer_cache import answer_key, get_answer_cache, index_version
 
 from dotenv import load_dotenv
 
@@ -55,62 +61,54 @@ _llm = None
 def get_llm():
     global _llm
     if _llm is None:
-        _llm = ChatGroq(
+        # Retries and concurrency are handled by the shared LLM gateway
+        _llm = GatedChatModel(llm=ChatGroq(
             api_key=GROQ_API_KEY,
             model_name=GROQ_MODEL,
-            temperature=0.6
-        )
+            temperature=0.6,
+            max_retries=0
+        ))
     return _llm
 
 
-import json
-import pickle
-import faiss
-
-
 def retrieve_docs(query, index_path, metadata_path, top_k=5,
-                  department=None, year=None, section=None):
-    if not os.path.exists(index_path):
+                  department=None, year=None, section=None, query_vec=None):
+    """
+    Search one index. Pass `query_vec` (normalized, shape (1, dim)) to reuse
+    an embedding already computed for this turn; otherwise `query` is embedded.
+    """
+    if not store_exists(index_path):
         return []
 
-    embeddings = get_embeddings()
-    query_vec = embeddings.embed_query(query)
-    query_vec = np.array([query_vec]).astype("float32")
-    faiss.normalize_L2(query_vec)  # normalize to match stored vectors
+    if query_vec is None:
+        query_vec = embed_query_vector(query)
 
-    index = create_or_load_faiss(index_path, len(query_vec[0]))
+    store_path = ensure_chunk_store(index_path, metadata_path)
 
-    # Retrieve more candidates to allow for filtering
-    fetch_k = top_k * 4 if (department or year or section) else top_k
-    scores, ids = index.search(query_vec, min(fetch_k, index.ntotal))
+    # Searches every segment of the current index snapshot (indexes are
+    # served from the process-wide cache). Academic filters are applied
+    # inside the search, so a filtered query still gets top_k matches.
+    hits = search(index_path, query_vec, top_k,
+                  department=department, year=year, section=section)
 
-    with open(metadata_path, "rb") as f:
-        metadatas = pickle.load(f)
+    # Only the hit rows are read from the chunk store
+    chunks = get_chunks(store_path, [i for _, i in hits])
 
     results = []
-    for score, idx in zip(scores[0], ids[0]):
-        if idx < 0 or idx >= len(metadatas):
-            continue
-        meta = metadatas[idx]
-
-        # Filter by academic metadata if provided
-        if department and meta.get("department") and meta["department"] != department:
-            continue
-        if year and meta.get("year") and meta["year"] != year:
-            continue
-        if section and meta.get("section") and meta["section"] != section:
+    for score, idx in hits:
+        meta = chunks.get(idx)
+        if meta is None:
             continue
 
         results.append({
+            "id": idx,
             "text": meta["text"],
             "score": float(score),
             "source": meta.get("source", "Unknown"),
-            "page": meta.get("page", 0)
+            "page": meta.get("page", 0),
+            "doc_id": meta.get("doc_id")      # FacultyDocument id (faculty chunks)
         })
 
-        if len(results) >= top_k:
-            break
-
     return results
 
 
@@ -130,6 +128,96 @@ def rag_answer(query: str, user_id, session_id: int | None,
                chat_mode: str = "rag",
                department: str = None, year: int = None, section: str = None,
                history: list = None):
+    chain, inputs, sources, cache_key = answer_chain(query, user_id, session_id, chat_mode,
+                                                     department, year, section, history)
+    answer = get_answer_cache().get(cache_key)
+    if answer is None:
+        started = time.perf_counter()
+        with llm_request(user_id, "answer"):
+            answer = chain.invoke(inputs).content.strip()
+        get_answer_cache().put(cache_key, answer, time.perf_counter() - started)
+    return {"answer": answer, "sources": sources}
+
+
+# -----------------------------
+# Async entry points
+# -----------------------------
+# Retrieval (query embedding + FAISS search + disk reads) is CPU-bound and
+# runs on its own small pool; the LLM round-trip is awaited on the event
+# loop, so a request waiting on Groq holds no thread at all.
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", str(min(8, os.cpu_count() or 1))))
+_retrieval_executor = None
+
+def get_retrieval_executor() -> ThreadPoolExecutor:
+    global _retrieval_executor
+    if _retrieval_executor is None:
+        _retrieval_executor = ThreadPoolExecutor(
+            max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval"
+        )
+    return _retrieval_executor
+
+
+async def answer_chain_async(*args, **kwargs):
+    """answer_chain on the retrieval executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_retrieval_executor(), functools.partial(answer_chain, *args, **kwargs)
+    )
+
+
+async def rag_answer_async(query: str, user_id, session_id: int | None,
+                           chat_mode: str = "rag",
+                           department: str = None, year: int = None, section: str = None,
+                           history: list = None):
+    chain, inputs, sources, cache_key = await answer_chain_async(
+        query, user_id, session_id, chat_mode, department, year, section, history
+    )
+    answer = get_answer_cache().get(cache_key)
+    if answer is None:
+        started = time.perf_counter()
+        with llm_request(user_id, "answer"):
+            answer = (await chain.ainvoke(inputs)).content.strip()
+        get_answer_cache().put(cache_key, answer, time.perf_counter() - started)
+    return {"answer": answer, "sources": sources}
+
+
+async def rag_answer_astream(query: str, user_id, session_id: int | None,
+                             chat_mode: str = "rag",
+                             department: str = None, year: int = None, section: str = None,
+                             history: list = None):
+    """
+    Streaming rag_answer_async: yields ("sources", list) once retrieval is
+    done, then ("token", text) for each piece of the answer as the LLM
+    produces it.
+    """
+    chain, inputs, sources, cache_key = await answer_chain_async(
+        query, user_id, session_id, chat_mode, department, year, section, history
+    )
+    yield "sources", sources
+    cached = get_answer_cache().get(cache_key)
+    if cached is not None:
+        yield "token", cached
+        return
+
+    started, parts = time.perf_counter(), []
+    with llm_request(user_id, "answer"):
+        async for chunk in chain.astream(inputs):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield "token", chunk.content
+    get_answer_cache().put(cache_key, "".join(parts).strip(), time.perf_counter() - started)
+
+
+def answer_chain(query: str, user_id, session_id: int | None,
+                 chat_mode: str = "rag",
+                 department: str = None, year: int = None, section: str = None,
+                 history: list = None):
+    """
+    Retrieval + prompt for a question, without calling the LLM.
+    Returns (chain, inputs, sources, cache_key): invoke or stream chain
+    with inputs. cache_key is set for answers the answer cache may share
+    (history-free, from faculty material), else None.
+    """
     llm = get_llm()
     history = history or []
 
@@ -137,10 +225,13 @@ def rag_answer(query: str, user_id, session_id: int | None,
     # GENERAL MODE: Skip FAISS entirely
     # ----------------------------
     if chat_mode == "general":
-        return {"answer": study_only_answer(query, history=history), "sources": []}
+        return (*study_chain(query, history=history), [], None)
 
     SIMILARITY_THRESHOLD = 0.35
 
+    # Embed once; both the session lookup and the faculty fallback reuse it
+    query_vec = embed_query_vector(query)
+
     # ----------------------------
     # RAG MODE: Session docs take priority over faculty docs.
     # If the student uploaded a paper to this session, answer from it first.
@@ -151,10 +242,12 @@ def rag_answer(query: str, user_id, session_id: int | None,
     session_relevant = []
     if session_id:
         session_index_path = f"data/faiss/sessions/{session_id}.faiss"
+        thaw(session_index_path)   # idle sessions are kept in cold storage
         session_results = retrieve_docs(
             query,
             session_index_path,
-            session_index_path + ".meta"
+            session_index_path + ".meta",
+            query_vec=query_vec
         )
         if session_results:
             if _is_summary_query(query):
@@ -168,19 +261,27 @@ def rag_answer(query: str, user_id, session_id: int | None,
                 session_relevant = [r for r in session_results if r["score"] >= SIMILARITY_THRESHOLD]
 
     # STEP 2: Use session results if relevant; otherwise fall back to faculty docs.
+    cache_key = None
     if session_relevant:
         top_results = sorted(session_relevant, key=lambda x: x["score"], reverse=True)[:4]
     else:
+        # Read before the search: if the index changes in between, the
+        # answer is cached under the older version and never served
+        faculty_version = index_version(FACULTY_INDEX_PATH) if not history else None
         faculty_results = retrieve_docs(
             query,
             FACULTY_INDEX_PATH,
             FACULTY_INDEX_PATH + ".meta",
             department=department,
             year=year,
-            section=section
+            section=section,
+            query_vec=query_vec
         )
         faculty_relevant = [r for r in faculty_results if r["score"] >= SIMILARITY_THRESHOLD]
         top_results = sorted(faculty_relevant, key=lambda x: x["score"], reverse=True)[:4]
+        # History-free answers from faculty material are shared between students
+        cache_key = answer_key(FACULTY_INDEX_PATH, faculty_version,
+                               [r["id"] for r in top_results], query_vec)
 
     # ----------------------------
     # USE PDF ONLY IF RELEVANT CHUNKS FOUND
@@ -195,10 +296,13 @@ def rag_answer(query: str, user_id, session_id: int | None,
             key = (r["source"], r["page"])
             if key not in seen:
                 seen.add(key)
-                sources.append({
+                source = {
                     "document_name": r["source"],
                     "page_number": r["page"] + 1  # 1-indexed for display
-                })
+                }
+                if r.get("doc_id") is not None:
+                    source["doc_id"] = r["doc_id"]   # used for PDF preview
+                sources.append(source)
 
         history_text = _format_history(history)
 
@@ -230,15 +334,13 @@ Answer:""",
             input_variables=["context", "question", "history"]
         )
 
-        answer = (prompt | llm).invoke({
+        return prompt | llm, {
             "context": context,
             "question": query,
             "history": history_text
-        }).content.strip()
-
-        return {"answer": answer, "sources": sources}
+        }, sources, cache_key
 
     # ----------------------------
     # GENERAL STUDY ANSWER (fallback when no relevant docs found)
     # ----------------------------
-    return {"answer": study_only_answer(query, history=history), "sources": []}
+    return (*study_chain(query, history=history), [], None)
@@ -0,0 +1,195 @@
+"""
+Lifecycle of per-session indexes (data/faiss/sessions/{session_id}.faiss).
+
+- delete_session_store: removes a session's index when the chat is deleted.
+- freeze / thaw: an idle session's files are packed into one gzip tarball
+  ({session_id}.faiss.cold.tar.gz) and unpacked again on next use, so the
+  directory holds one small file per idle session. Segments shared with
+  other indexes (see doc_store) stay where they are and are still
+  referenced after a thaw.
+- sweep_session_stores: deletes stores of sessions that no longer exist
+  and freezes idle ones; called periodically by app.session_lifecycle.
+- collect_document_stores (run by each sweep): deletes the shared document
+  stores (data/faiss/docs) that no faculty or session index, hot or cold,
+  references any more.
+"""
+import json
+import os
+import re
+import tarfile
+import time
+
+from .vector_store import FAISS_BASE_PATH, index_path_for
+from .index_store import (
+    GC_GRACE_SECONDS, delete_store, list_stores, manifest_path, remove_store_files,
+    segment_files, store_exists, store_files, writer_lock
+)
+from .doc_store import DOCS_PATH, document_lock, is_ready
+
+
+SESSIONS_PATH = os.path.join(FAISS_BASE_PATH, "sessions")
+_SESSION_FILE = re.compile(r"^(\d+)\.faiss(\.|$)")
+
+
+def cold_path(index_path: str) -> str:
+    return index_path + ".cold.tar.gz"
+
+
+def is_cold(index_path: str) -> bool:
+    return os.path.exists(cold_path(index_path))
+
+
+def freeze(index_path: str) -> bool:
+    """Move a store into its cold archive. Returns False if there was nothing to do."""
+    with writer_lock(index_path):
+        if not store_exists(index_path) or is_cold(index_path):
+            return False
+        directory = os.path.dirname(index_path)
+        archive = cold_path(index_path)
+        tmp_path = f"{archive}.{os.getpid()}.tmp"
+        with tarfile.open(tmp_path, "w:gz") as tar:
+            for path in store_files(index_path):
+                tar.add(path, arcname=os.path.relpath(path, directory))
+        os.replace(tmp_path, archive)
+        remove_store_files(index_path)
+    return True
+
+
+def thaw(index_path: str) -> bool:
+    """
+    Restore a store from its cold archive, if it has one (cheap no-op
+    otherwise). The manifest is restored last, so readers never see a
+    manifest whose segments are missing.
+    Returns True if the store was restored.
+    """
+    if not is_cold(index_path):
+        return False
+    with writer_lock(index_path):
+        archive = cold_path(index_path)
+        if not os.path.exists(archive):
+            return False   # another worker restored it first
+        directory = os.path.dirname(index_path)
+        with tarfile.open(archive, "r:gz") as tar:
+            members = tar.getmembers()
+            manifest = os.path.basename(manifest_path(index_path))
+            members.sort(key=lambda m: m.name == manifest)
+            for member in members:
+                tar.extract(member, directory, filter="data")
+        os.remove(archive)
+    print(f"♨️ Restored {index_path} from cold storage")
+    return True
+
+
+def cold_manifest(index_path: str):
+    """The manifest inside a store's cold archive, or None."""
+    try:
+        with tarfile.open(cold_path(index_path), "r:gz") as tar:
+            return json.load(tar.extractfile(os.path.basename(manifest_path(index_path))))
+    except (FileNotFoundError, KeyError):
+        return None   # thawed meanwhile, or a legacy store without a manifest
+
+
+def delete_session_store(session_id: int) -> int:
+    """Delete a session's index, hot or cold. Returns the number of files removed."""
+    index_path = index_path_for("student", session_id)
+    removed = delete_store(index_path)
+    if is_cold(index_path):
+        os.remove(cold_path(index_path))
+        removed += 1
+    return removed
+
+
+def session_ids_on_disk() -> set:
+    """Ids of the sessions that have an index (hot or cold)."""
+    if not os.path.isdir(SESSIONS_PATH):
+        return set()
+    # Lock files outlive deleted stores (see index_store.remove_store_files)
+    names = [n for n in os.listdir(SESSIONS_PATH) if not n.endswith(".lock")]
+    return {int(match.group(1)) for match in map(_SESSION_FILE.match, names) if match}
+
+
+def sweep_session_stores(session_ids: set, live_ids: set, idle_ids: set) -> dict:
+    """
+    Of the indexes of `session_ids` (taken from session_ids_on_disk before
+    reading the live sessions, so a session created meanwhile is never
+    mistaken for an orphan), delete those not in `live_ids` and freeze
+    those in `idle_ids`.
+    """
+    removed = frozen = 0
+    for session_id in session_ids:
+        if session_id not in live_ids:
+            delete_session_store(session_id)
+            removed += 1
+        elif session_id in idle_ids and freeze(index_path_for("student", session_id)):
+            frozen += 1
+    if removed or frozen:
+        print(f"🧹 Session indexes: {removed} orphans deleted, {frozen} moved to cold storage")
+    return {"orphans_deleted": removed, "frozen": frozen,
+            "documents_deleted": collect_document_stores()}
+
+
+# -----------------------------
+# Shared document stores
+# -----------------------------
+def _referenced_documents() -> set:
+    """Content hashes of the document stores some faculty or session index references."""
+    def cold():
+        for session_id in session_ids_on_disk():
+            index_path = index_path_for("student", session_id)
+            manifest = cold_manifest(index_path)
+            if manifest:
+                files.update(segment_files(index_path, manifest))
+
+    files = set()
+    # Cold, hot, cold again: a store frozen or thawed during the scan is
+    # seen in at least one of the two places
+    cold()
+    docs_dir = os.path.normpath(DOCS_PATH)
+    for index_path in list_stores(FAISS_BASE_PATH):
+        if (os.path.normpath(os.path.dirname(index_path)) != docs_dir
+                and os.path.exists(manifest_path(index_path))):
+            files.update(segment_files(index_path))
+    cold()
+
+    return {
+        os.path.relpath(path, docs_dir).split(os.sep)[0].split(".")[0]
+        for path in files if path.startswith(docs_dir + os.sep)
+    }
+
+
+def _unmark(marker: str):
+    try:
+        os.remove(marker)
+    except FileNotFoundError:
+        pass
+
+
+def collect_document_stores(grace_seconds: int = GC_GRACE_SECONDS) -> int:
+    """
+    Delete the ready document stores no index references (every upload of
+    the document was deleted, or compacted into its index). A store is
+    first marked, and deleted by a later sweep once it has stayed
+    unreferenced for the grace period (readers of an older manifest may
+    still be loading its segments). Returns the number deleted.
+    """
+    referenced = _referenced_documents()
+    deleted = 0
+    for index_path in list_stores(DOCS_PATH):
+        content_hash = os.path.basename(index_path).split(".")[0]
+        marker = index_path + ".unreferenced"
+        if content_hash in referenced or not is_ready(content_hash):
+            _unmark(marker)
+            continue
+
+        # attach_document holds this lock while it adds a reference
+        with document_lock(content_hash):
+            if content_hash in _referenced_documents():
+                _unmark(marker)   # attached meanwhile
+            elif not os.path.exists(marker):
+                open(marker, "w").close()
+            elif time.time() - os.path.getmtime(marker) >= grace_seconds:
+                delete_store(index_path)   # the marker goes with it
+                deleted += 1
+    if deleted:
+        print(f"🧹 Deleted {deleted} unreferenced document stores")
+    return deleted
@@ -2,20 +2,24 @@ from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 import os
 
+from .llm_gateway import GatedChatModel
+
 _llm = None
 
 def _get_llm():
     global _llm
     if _llm is None:
-        _llm = ChatGroq(
+        _llm = GatedChatModel(llm=ChatGroq(
             api_key=os.getenv("GROQ_API_KEY"),
             model_name="llama-3.3-70b-versatile",
-            temperature=0.4
-        )
+            temperature=0.4,
+            max_retries=0
+        ))
     return _llm
 
 
-def study_only_answer(query: str, history: list = None) -> str:
+def study_chain(query: str, history: list = None):
+    """(chain, inputs) for a general study answer; invoke or stream it."""
     llm = _get_llm()
 
     system_prompt = """
@@ -50,5 +54,4 @@ def study_only_answer(query: str, history: list = None) -> str:
     messages.append(("human", "{query}"))
 
     prompt = ChatPromptTemplate.from_messages(messages)
-    response = (prompt | llm).invoke({"query": query})
-    return response.content.strip()
+    return prompt | llm, {"query": query}
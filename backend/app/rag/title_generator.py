@@ -1,11 +1,35 @@
+import re
+
 from app.rag.pipeline import get_llm
+from app.rag.llm_gateway import llm_request
 
-def generate_chat_title(messages: list[str]) -> str:
-    llm = get_llm()
+# Question words and filler dropped from extractive titles
+_TITLE_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "about",
+    "is", "are", "was", "were", "be", "do", "does", "did", "can", "could", "would",
+    "should", "will", "what", "whats", "which", "who", "how", "why", "when", "where",
+    "i", "me", "my", "you", "your", "we", "it", "its", "this", "that", "these", "those",
+    "please", "explain", "tell", "give", "help", "describe", "define", "some", "any",
+}
+_TITLE_WORD = re.compile(r"[A-Za-z0-9][A-Za-z0-9+#'-]*")
 
+
+def extractive_title(question: str, max_words: int = 6) -> str:
+    """
+    Instant placeholder title from the question's first content words
+    ("What are the phases of mitosis?" -> "Phases Mitosis"), shown until
+    the LLM title is ready.
+    """
+    words = _TITLE_WORD.findall(question)
+    keep = [w for w in words if w.lower().replace("'", "") not in _TITLE_STOPWORDS] or words
+    title = " ".join(w[0].upper() + w[1:] for w in keep[:max_words])
+    return title or "New Chat"
+
+
+def _title_prompt(messages: list[str]) -> str:
     text = "\n".join(messages[:3])  # only first few messages
 
-    prompt = f"""
+    return f"""
 Generate a very short (3–6 words) title for this student chat.
 Rules:
 - No quotes
@@ -19,7 +43,20 @@ Chat:
 Title:
 """
 
-    response = llm.invoke(prompt)
+
+def generate_chat_title(messages: list[str], user_id=None) -> str:
+    llm = get_llm()
+    with llm_request(user_id, "title"):   # queued behind chat answers
+        response = llm.invoke(_title_prompt(messages))
+    title = response.content.strip()
+
+    return title or "New Chat"
+
+
+async def generate_chat_title_async(messages: list[str], user_id=None) -> str:
+    llm = get_llm()
+    with llm_request(user_id, "title"):
+        response = await llm.ainvoke(_title_prompt(messages))
     title = response.content.strip()
 
     return title or "New Chat"
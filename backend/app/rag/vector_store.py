@@ -1,15 +1,49 @@
 import numpy as np
 import os
+import queue
+import threading
 import faiss
-import pickle
-from typing import List
 
-from .embeddings import get_embeddings
-from .ingest import ingest_pdf
+from .embeddings import embed_documents_cached
+from .ingest import (
+    count_pdf_pages, iter_pdf_pages, clean_source_name,
+    StudyChunker, chunk_metadata, CHUNK_ACROSS_PAGES
+)
+from .dedup import IngestDeduper, INGEST_DEDUP
+from .index_cache import get_index_cache
+from .chunk_store import ensure_chunk_store
 
 
 FAISS_BASE_PATH = "data/faiss"
 
+# Index type: "auto" keeps a flat (exact) index until the corpus passes
+# FAISS_APPROX_THRESHOLD vectors, then switches to FAISS_APPROX_KIND.
+# "flat", "ivf", "ivfpq" and "hnsw" force a type (approximate types still
+# stay flat until there are enough vectors to train them).
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+FAISS_APPROX_KIND = os.getenv("FAISS_APPROX_KIND", "ivf")
+FAISS_APPROX_THRESHOLD = int(os.getenv("FAISS_APPROX_THRESHOLD", "100000"))
+
+# How vectors are stored inside the index (384-d MiniLM vectors):
+#   "float32" 1536 B/vector (exact), "float16" 768 B, "int8" 384 B
+#   (scalar quantized), "pq" 48 B (product quantized, needs ~10k vectors
+#   to train; int8 is used until then). "ivfpq" implies "pq".
+FAISS_VECTOR_CODEC = os.getenv("FAISS_VECTOR_CODEC", "float32")
+
+# Search-time recall/latency knobs
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))         # IVF lists scanned
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))   # HNSW candidate list
+FAISS_HNSW_M = 32
+
+# Streaming ingestion (see ingest_and_store_pdf)
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))       # chunks per embed_documents call
+INGEST_COMMIT_CHUNKS = int(os.getenv("INGEST_COMMIT_CHUNKS", "512"))  # chunks per index segment
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))          # batches buffered between stages
+
+CODECS = ("float32", "float16", "int8", "pq")
+PQ_MIN_TRAIN = 39 * 256     # 256 centroids per PQ sub-quantizer
+SQ8_MIN_TRAIN = 1000        # enough to estimate per-dimension ranges
+
 
 # -----------------------------
 # Utility
@@ -19,21 +53,234 @@ def ensure_dir(path: str):
 
 
 # -----------------------------
-# Load or create FAISS index
+# Index factory
+# -----------------------------
+def _ivf_nlist(ntotal: int) -> int:
+    # ~4*sqrt(n) inverted lists is the usual FAISS starting point
+    return max(1, min(65536, int(4 * np.sqrt(max(ntotal, 1)))))
+
+
+def _configured_kind(ntotal: int) -> str:
+    if FAISS_INDEX_TYPE == "auto":
+        return "flat" if ntotal < FAISS_APPROX_THRESHOLD else FAISS_APPROX_KIND
+    return FAISS_INDEX_TYPE
+
+
+def choose_index_kind(ntotal: int) -> str:
+    """Index kind to use for a corpus of `ntotal` vectors under current config."""
+    kind = _configured_kind(ntotal)
+    if kind == "ivfpq":
+        kind = "ivf"
+    if kind == "ivf" and ntotal < 39 * _ivf_nlist(ntotal):
+        return "flat"   # not enough vectors to train the coarse quantizer yet
+    return kind
+
+
+def choose_codec(ntotal: int, codec: str = None) -> str:
+    """Vector codec to use for `ntotal` vectors, falling back while untrainable."""
+    codec = codec or ("pq" if _configured_kind(ntotal) == "ivfpq" else FAISS_VECTOR_CODEC)
+    if codec == "pq" and ntotal < PQ_MIN_TRAIN:
+        codec = "int8"
+    if codec == "int8" and ntotal < SQ8_MIN_TRAIN:
+        codec = "float16"   # needs no training
+    return codec
+
+
+def index_spec(kind: str, dim: int, ntotal: int, codec: str = "float32") -> str:
+    """faiss.index_factory string for an index kind and vector codec."""
+    encoding = {
+        "float32": "Flat", "float16": "SQfp16", "int8": "SQ8", "pq": f"PQ{dim // 8}",
+    }[codec]
+    if kind == "flat":
+        # IndexPQ does not accept SearchParameters (no ID selector);
+        # a single-list IVF scans the same codes and does.
+        return f"IVF1,{encoding}" if codec == "pq" else encoding
+    if kind == "ivf":
+        return f"IVF{_ivf_nlist(ntotal)},{encoding}"
+    if kind == "hnsw":
+        return f"HNSW{FAISS_HNSW_M}" + ("" if codec == "float32" else f",{encoding}")
+    raise ValueError(f"Unknown FAISS index kind: {kind}")
+
+
+def index_kind(index) -> str:
+    """Kind of an existing index (see index_spec)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return "flat" if ivf.nlist == 1 else "ivf"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def index_codec(index) -> str:
+    """Vector codec of an existing index (see index_spec)."""
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        index = faiss.downcast_index(ivf)   # the extracted IVF is the base class
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "float16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "int8"
+    return "float32"
+
+
+def build_index(vectors: np.ndarray, kind: str, codec: str = "float32"):
+    """Create, train (if needed) and fill an inner-product index."""
+    dim = vectors.shape[1]
+    index = faiss.index_factory(dim, index_spec(kind, dim, len(vectors), codec),
+                                faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        index.train(vectors)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()   # keeps reconstruct() working for later rebuilds
+    index.add(vectors)
+    return index
+
+
+def maybe_rebuild_index(index, codec: str = None):
+    """
+    Switch to the configured index kind and codec once the corpus is large
+    enough (e.g. flat -> IVF above the threshold, float16 -> PQ once it can
+    be trained), and retrain an IVF index whose list count is far below
+    what the current size calls for.
+    Returns the index to keep using (possibly the same object).
+    """
+    kind = choose_index_kind(index.ntotal)
+    codec = choose_codec(index.ntotal, codec)
+    current = (index_kind(index), index_codec(index))
+
+    needs_rebuild = (kind, codec) != current
+    ivf = faiss.try_extract_index_ivf(index)
+    if not needs_rebuild and ivf is not None and ivf.nlist > 1:
+        needs_rebuild = _ivf_nlist(index.ntotal) >= 4 * ivf.nlist
+
+    if not needs_rebuild or index.ntotal == 0:
+        return index
+
+    print(f"🔁 Rebuilding FAISS index: {current} -> {(kind, codec)} ({index.ntotal} vectors)")
+    vectors = index.reconstruct_n(0, index.ntotal)
+    return build_index(vectors, kind, codec)
+
+
+# -----------------------------
+# Cached read path (used by retrieval)
 # -----------------------------
-def create_or_load_faiss(index_path: str, dim: int):
-    if os.path.exists(index_path):
-        return faiss.read_index(index_path)
-    return faiss.IndexFlatIP(dim)
+def _read_index(index_path: str):
+    return faiss.read_index(index_path), os.path.getsize(index_path)
 
 
-def save_faiss(index, index_path: str):
-    faiss.write_index(index, index_path)
+def load_faiss_cached(index_path: str):
+    """
+    Read-only FAISS index shared across requests in this process.
+    Reloaded automatically when the file on disk changes.
+    Never mutate the returned index — writes go through index_store.
+    """
+    return get_index_cache().get_or_load(index_path, _read_index)
+
+
+def search_index(index, query_vec: np.ndarray, k: int, selector=None,
+                 n_matching: int = None, nprobe: int = None, ef_search: int = None):
+    """
+    Top-k search, restricted to `selector` ids when given.
+
+    For approximate indexes the nprobe / efSearch knobs default to the
+    configured values and are widened for selective filters (n_matching),
+    so a filtered query does not run out of candidates.
+    """
+    widen = 1.0
+    if selector is not None and n_matching:
+        widen = index.ntotal / n_matching
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF()
+        params.nprobe = min(ivf.nlist, int(np.ceil((nprobe or FAISS_NPROBE) * widen)))
+    elif isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = min(4096, max(k, int(np.ceil((ef_search or FAISS_EF_SEARCH) * widen))))
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return index.search(query_vec, k)
+
+    if selector is not None:
+        params.sel = selector
+    return index.search(query_vec, k, params=params)
 
 
 # -----------------------------
 # Ingest PDF and store vectors
 # -----------------------------
+def index_path_for(owner_type: str, session_id: int | None = None) -> str:
+    """FAISS index path for faculty material or a student's chat session."""
+    if owner_type == "faculty":
+        return os.path.join(FAISS_BASE_PATH, "faculty", "index.faiss")
+
+    elif owner_type == "student":
+        if session_id is None:
+            raise ValueError("session_id is required for student uploads")
+        return os.path.join(FAISS_BASE_PATH, "sessions", f"{session_id}.faiss")
+
+    raise ValueError("Invalid owner_type")
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_STAGE_DONE = object()
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    # Blocks while the next stage is behind, but gives up once the
+    # pipeline is being torn down
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _drain(q: queue.Queue, stop: threading.Event):
+    # A stage torn down by `stop` puts no _STAGE_DONE, so never block on
+    # it forever: stop reading once the pipeline is stopped and drained
+    while True:
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+        if item is _STAGE_DONE:
+            return
+        if isinstance(item, _StageError):
+            raise item.error
+        yield item
+
+
+def _start_stage(produce, out_q: queue.Queue, stop: threading.Event) -> threading.Thread:
+    """Run the generator `produce()` in a thread, feeding its items into `out_q`."""
+    def run():
+        try:
+            for item in produce():
+                if not _put(out_q, item, stop):
+                    return
+        except BaseException as e:
+            _put(out_q, _StageError(e), stop)
+            return
+        _put(out_q, _STAGE_DONE, stop)
+
+    thread = threading.Thread(target=run, daemon=True, name="ingest-stage")
+    thread.start()
+    return thread
+
+
 def ingest_and_store_pdf(
     pdf_path: str,
     owner_type: str,          # "faculty" or "student"
@@ -41,85 +288,160 @@ def ingest_and_store_pdf(
     session_id: int | None = None,
     department: str = None,
     year: int = None,
-    section: str = None
+    section: str = None,
+    start_page: int = 0,      # pages before this one are already indexed
+    skip_chunks: int = 0,     # chunks from start_page on that are already indexed
+    progress=None,            # progress(pages_done, pages_total, chunks_added, skip_chunks)
+    index_path: str = None,   # store to write to (default: index_path_for owner)
+    doc_id: int = None        # FacultyDocument id, recorded on every chunk
 ):
-    embeddings = get_embeddings()
-    print("🔢 Embedding dim:", len(embeddings.embed_query("test")))
-    dim = len(embeddings.embed_query("dimension_check"))
+    """
+    Streaming ingestion: pages are extracted and chunked, embedded in
+    INGEST_EMBED_BATCH-sized batches and appended to the index every
+    INGEST_COMMIT_CHUNKS chunks. Each stage runs in its own thread joined
+    by bounded queues, so stages overlap and memory does not grow with
+    the size of the PDF.
+
+    `progress` is called after each commit with where an interrupted
+    ingestion can restart: the page the chunker last started from empty
+    (every page before it is indexed) and how many of the chunks it has
+    emitted since are indexed. A resume re-chunks from that page and skips
+    those chunks, so with CHUNK_ACROSS_PAGES a block spanning a page
+    boundary is neither lost nor indexed twice.
 
+    With INGEST_DEDUP, repeated header/footer lines and near-duplicate
+    chunks are dropped before embedding (see dedup.py); the result's
+    "dedup" entry reports how much smaller the index is for it.
+    """
     # ---------------------------------
     # Decide storage path
     # ---------------------------------
-    if owner_type == "faculty":
-        index_dir = os.path.join(FAISS_BASE_PATH, "faculty")
-        index_path = os.path.join(index_dir, "index.faiss")
-
-    elif owner_type == "student":
-        if session_id is None:
-            raise ValueError("session_id is required for student uploads")
-
-        index_dir = os.path.join(FAISS_BASE_PATH, "sessions")
-        index_path = os.path.join(index_dir, f"{session_id}.faiss")
-
-    else:
-        raise ValueError("Invalid owner_type")
-
-    ensure_dir(index_dir)
+    index_path = index_path or index_path_for(owner_type, session_id)
+    ensure_dir(os.path.dirname(index_path))
 
     # ---------------------------------
-    # Load or create FAISS index
+    # Chunk store (migrates a legacy .meta file on first use)
     # ---------------------------------
-    index = create_or_load_faiss(index_path, dim)
+    ensure_chunk_store(index_path)
 
-    # ---------------------------------
-    # Load metadata
-    # ---------------------------------
-    meta_path = index_path + ".meta"
-    if os.path.exists(meta_path):
-        with open(meta_path, "rb") as f:
-            metadata_store = pickle.load(f)
-    else:
-        metadata_store = []
+    pages_total = count_pdf_pages(pdf_path)
+    source = clean_source_name(pdf_path)
+    print("📄 PDF pages:", pages_total)
+    deduper = IngestDeduper() if INGEST_DEDUP else None
 
     # ---------------------------------
-    # Ingest PDF
+    # Stage 1: extract + chunk, page by page
     # ---------------------------------
-    chunks, metadatas = ingest_pdf(
-        pdf_path=pdf_path,
-        owner_type=owner_type,
-        owner_id=owner_id,
-        session_id=session_id     # ✅ PASS SESSION
-    )
-    print("📄 PDF chunks:", len(chunks))
-    # print("📐 Vector shape:", vectors.shape)
-    print("📦 Index size BEFORE:", index.ntotal)
+    def chunk_batches():
+        chunker = StudyChunker(across_pages=CHUNK_ACROSS_PAGES)
+        chunks, metadatas = [], []
+        # Resume point: the chunker was empty at the start of page `anchor`
+        # and has emitted `emitted` chunks since
+        anchor, emitted = start_page, 0
+        skip = skip_chunks
+
+        def take(pieces):
+            nonlocal emitted, skip
+            for chunk, page_meta in pieces:
+                emitted += 1
+                # Skipped chunks still go through the deduper, so its state
+                # matches the run that indexed them
+                duplicate = deduper is not None and deduper.is_duplicate(chunk)
+                if skip:
+                    skip -= 1
+                    continue
+                if duplicate:
+                    continue
+                meta = chunk_metadata(
+                    page_meta, source,
+                    owner_type=owner_type,
+                    owner_id=owner_id,
+                    session_id=session_id     # ✅ PASS SESSION
+                )
+                meta["text"] = chunk
+                if department: meta["department"] = department
+                if year: meta["year"] = year
+                if section: meta["section"] = section
+                if doc_id is not None: meta["doc_id"] = doc_id
+                chunks.append(chunk)
+                metadatas.append(meta)
+
+        for text, page_meta in iter_pdf_pages(pdf_path, start_page):
+            if deduper:
+                text = deduper.strip_boilerplate(text, page_meta["page"])
+            take(chunker.add_page(text, page_meta))
+            # With CHUNK_ACROSS_PAGES a block may still hold the end of this
+            # page; only an empty chunker is a clean place to restart from
+            if chunker.pending_page is None:
+                anchor, emitted = page_meta["page"] + 1, 0
+
+            if len(chunks) >= INGEST_EMBED_BATCH:
+                yield chunks, metadatas, (anchor, emitted)
+                chunks, metadatas = [], []
+
+        take(chunker.finish())
+        yield chunks, metadatas, (pages_total, 0)
 
     # ---------------------------------
-    # Embed & add
+    # Stage 2: embed (unchanged chunks come from the embedding cache)
     # ---------------------------------
-    vectors = np.array(
-        embeddings.embed_documents(chunks)
-    ).astype("float32")
-    faiss.normalize_L2(vectors)  # normalize so IndexFlatIP = cosine similarity
-    index.add(vectors)
-    print("📦 Index size AFTER:", index.ntotal)
+    def embedded_batches():
+        for chunks, metadatas, resume_at in _drain(chunk_q, stop):
+            if not chunks:
+                yield None, metadatas, resume_at   # pages without text still count
+                continue
+            vectors = embed_documents_cached(chunks)
+            faiss.normalize_L2(vectors)  # normalize so IndexFlatIP = cosine similarity
+            yield vectors, metadatas, resume_at
 
-    for meta, text in zip(metadatas, chunks):
-        meta["text"] = text
-        if department: meta["department"] = department
-        if year: meta["year"] = year
-        if section: meta["section"] = section
-        metadata_store.append(meta)
+    stop = threading.Event()
+    chunk_q = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+    vector_q = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+    stages = [
+        _start_stage(chunk_batches, chunk_q, stop),
+        _start_stage(embedded_batches, vector_q, stop),
+    ]
 
     # ---------------------------------
-    # Persist
+    # Stage 3: persist as append-only segments
     # ---------------------------------
-    save_faiss(index, index_path)
-    print("🧠 Saving index to:", index_path)
-    with open(meta_path, "wb") as f:
-        pickle.dump(metadata_store, f)
+    from .index_store import append_vectors
+
+    chunks_added = 0
+    pending_vectors, pending_metas = [], []
+    resume_at = (start_page, skip_chunks)
+
+    def commit():
+        nonlocal chunks_added, pending_vectors, pending_metas
+        if pending_metas:
+            ids = append_vectors(index_path, np.vstack(pending_vectors), pending_metas)
+            print("🧠 Added vectors", ids.start, "to", ids.stop - 1, "in:", index_path)
+            chunks_added += len(pending_metas)
+        pending_vectors, pending_metas = [], []
+        if progress:
+            progress(resume_at[0], pages_total, chunks_added, resume_at[1])
+
+    try:
+        for vectors, metadatas, resume_at in _drain(vector_q, stop):
+            if metadatas:
+                pending_vectors.append(vectors)
+                pending_metas.extend(metadatas)
+            if len(pending_metas) >= INGEST_COMMIT_CHUNKS:
+                commit()
+        commit()
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join()
+
+    report = deduper.report() if deduper else None
+    if report and report["chunks_seen"]:
+        print(f"✂️ Dedup: dropped {report['chunks_dropped']}/{report['chunks_seen']} chunks "
+              f"and {report['boilerplate_lines_removed']} boilerplate lines "
+              f"({report['index_reduction']:.1%} smaller index)")
 
     return {
-        "chunks_added": len(chunks),
-        "index_path": index_path
+        "chunks_added": chunks_added,
+        "index_path": index_path,
+        "dedup": report
     }
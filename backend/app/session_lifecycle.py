@@ -0,0 +1,68 @@
+"""
+Periodic cleanup of per-session indexes.
+
+Every SESSION_SWEEP_INTERVAL_SECONDS a background thread deletes the
+indexes of sessions that no longer exist (e.g. a chat deleted while its
+upload was still being indexed) and moves the indexes of sessions idle for
+SESSION_COLD_AFTER_DAYS into compressed cold storage
+(app.rag.session_store). A cold index is restored on the session's next
+question or upload. Each sweep also deletes the shared document stores
+that no index references any more, and the segment files compaction
+superseded in any index (app.rag.index_store.collect_all_garbage).
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.db.database import SessionLocal
+from app.db import crud
+from app.rag.vector_store import FAISS_BASE_PATH
+from app.rag.index_store import collect_all_garbage
+from app.rag.session_store import session_ids_on_disk, sweep_session_stores
+
+
+# -----------------------------
+# Config
+# -----------------------------
+SESSION_COLD_AFTER_DAYS = float(os.getenv("SESSION_COLD_AFTER_DAYS", "14"))
+SESSION_SWEEP_INTERVAL_SECONDS = int(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "3600"))
+
+
+def sweep_sessions() -> dict:
+    on_disk = session_ids_on_disk()   # before the DB read, see sweep_session_stores
+    db = SessionLocal()
+    try:
+        activity = crud.get_session_activity(db)
+        busy = crud.get_active_ingest_session_ids(db)
+    finally:
+        db.close()
+
+    cutoff = datetime.utcnow() - timedelta(days=SESSION_COLD_AFTER_DAYS)
+    idle = {sid for sid, last in activity.items() if last and last < cutoff and sid not in busy}
+    # A session with an upload in flight is kept even if its row is gone;
+    # a later sweep deletes its index
+    result = sweep_session_stores(on_disk, live_ids=set(activity) | busy, idle_ids=idle)
+    result["index_files_deleted"] = collect_all_garbage(FAISS_BASE_PATH)
+    return result
+
+
+_sweeper = None
+
+
+def start_session_sweeper():
+    """Start the sweeper thread (once per process)."""
+    global _sweeper
+    if _sweeper is not None or SESSION_SWEEP_INTERVAL_SECONDS <= 0:
+        return
+
+    def run():
+        while True:
+            try:
+                sweep_sessions()
+            except Exception as e:
+                print(f"⚠️ Session sweep failed: {e}")
+            time.sleep(SESSION_SWEEP_INTERVAL_SECONDS)
+
+    _sweeper = threading.Thread(target=run, daemon=True, name="session-sweeper")
+    _sweeper.start()
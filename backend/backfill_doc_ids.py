@@ -0,0 +1,56 @@
+"""
+Record the FacultyDocument id on faculty chunks indexed before chunks
+carried one, so /chat citations link to their PDF. Run from the backend
+directory (safe to run more than once):
+
+    python backfill_doc_ids.py
+
+A faculty index still on a legacy .meta file is migrated to the chunk
+store first.
+
+A chunk is matched to a document by its source name: first the saved
+file name ("{uuid}_{original}.pdf", unique), then the original file name
+when exactly one faculty document has it. Chunks whose name is shared by
+several documents are left unlinked and reported.
+"""
+import os
+from collections import defaultdict
+
+from app.db.database import SessionLocal
+from app.db import models
+from app.rag.vector_store import index_path_for
+from app.rag.chunk_store import ensure_chunk_store, find_chunk_ids, link_source_chunks
+from app.rag.ingest import clean_source_name
+
+db_path = ensure_chunk_store(index_path_for("faculty", None))
+if not os.path.exists(db_path):
+    print(f"No faculty chunk store at {db_path}")
+    raise SystemExit(0)
+
+db = SessionLocal()
+try:
+    docs = (
+        db.query(models.FacultyDocument)
+        .filter(models.FacultyDocument.file_path != "__FOLDER__")
+        .all()
+    )
+    by_name = defaultdict(list)
+    for doc in docs:
+        by_name[clean_source_name(doc.file_path)].append(doc.id)
+
+    linked = 0
+    for doc in docs:
+        linked += link_source_chunks(db_path, os.path.basename(doc.file_path), doc.id)
+        name = clean_source_name(doc.file_path)
+        if by_name[name] == [doc.id]:
+            linked += link_source_chunks(db_path, name, doc.id)
+finally:
+    db.close()
+
+ambiguous = {name: ids for name, ids in by_name.items() if len(ids) > 1}
+for name, ids in ambiguous.items():
+    left = len(find_chunk_ids(db_path, doc_id=None, source=name))
+    if left:
+        print(f"Skipped {left} chunks of '{name}': shared by documents {ids}")
+
+print(f"Linked {linked} chunks; {len(find_chunk_ids(db_path, doc_id=None))} still without a doc_id")
@@ -0,0 +1,119 @@
+"""
+Load test: concurrent /chat requests against a worker threadpool that is
+smaller than the number of requests in flight.
+
+Run from the backend directory:
+    python -m benchmarks.chat_concurrency
+    python -m benchmarks.chat_concurrency --requests 200 --threads 8 --latency 1.0
+
+Each request is a new "general" chat, so it makes two LLM calls (answer +
+title). The LLM is a stand-in that only waits --latency seconds, like a
+Groq round-trip on an idle CPU. Both routes run in-process against a
+throwaway chat.db:
+
+  sync   the pre-async handler (sync def + invoke, title after the
+         answer): every request holds a threadpool thread for both calls,
+         so --requests / --threads batches queue one after another.
+  async  POST /chat: the waits are awaited on the event loop, threads are
+         only borrowed for DB queries and the title is generated in the
+         background, so wall time stays close to one LLM call however
+         small the threadpool is.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class SlowChatModel(BaseChatModel):
+    """Answers "ok" after `latency` seconds, blocking (invoke) or not (ainvoke)."""
+    latency: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _result(self):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._result()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._result()
+
+
+def add_sync_route(main):
+    """The /chat handler as it was before the async path, for comparison."""
+    from app.db.database import SessionLocal
+    from app.rag.pipeline import rag_answer
+    from app.rag.title_generator import generate_chat_title
+
+    @main.app.post("/bench/chat-sync")
+    def chat_sync(req: main.ChatRequest):
+        db = SessionLocal()
+        try:
+            session_id = main._chat_session_id(db, req)
+            turn, placeholder = main._start_chat_turn(db, req, session_id)
+            result = rag_answer(**turn)
+            main._save_answer(db, session_id, result["answer"], result["sources"])
+            if placeholder:
+                title = generate_chat_title([req.question])
+                main.crud.replace_chat_title(db, session_id, placeholder, title)
+            return {"session_id": session_id, **result}
+        finally:
+            db.close()
+
+
+async def run(app, path: str, requests: int, threads: int) -> float:
+    import anyio
+    import httpx
+
+    anyio.to_thread.current_default_thread_limiter().total_tokens = threads
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(i):
+            response = await client.post(path, json={
+                "question": f"Explain topic {i}", "user_id": f"student-{i}", "chat_mode": "general"
+            })
+            response.raise_for_status()
+            assert json.loads(response.text)["answer"] == "ok"
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64, help="concurrent requests")
+    parser.add_argument("--threads", type=int, default=4, help="worker threadpool size")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per LLM call")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="chat_bench_"))   # chat.db is relative to the cwd
+
+    from app import main as app_main
+    from app.rag import pipeline, study_llm
+
+    llm = SlowChatModel(latency=args.latency)
+    pipeline._llm = study_llm._llm = llm
+    add_sync_route(app_main)
+
+    print(f"requests={args.requests} threads={args.threads} llm latency={args.latency}s")
+    print(f"{'handler':<8}{'wall s':>10}{'req/s':>10}{'x latency':>12}")
+    for label, path in (("sync", "/bench/chat-sync"), ("async", "/chat")):
+        wall = asyncio.run(run(app_main.app, path, args.requests, args.threads))
+        print(f"{label:<8}{wall:>10.2f}{args.requests / wall:>10.1f}{wall / args.latency:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Micro-benchmark for study-aware chunking on long pages.
+
+Run from the backend directory:
+    python -m benchmarks.chunk_bench
+    python -m benchmarks.chunk_bench --lines 100 --line-length 2000
+
+Compares the original chunker (re-joins the whole buffer on every line,
+builds a new splitter per page and tests lines with the backtracking
+LAB_LINE regex) with app.rag.ingest.StudyChunker, and checks that both
+produce the same chunks for single-page input. Long lines (e.g. PDFs
+whose extracted text has few line breaks) show the biggest difference.
+"""
+import argparse
+import random
+import time
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.rag.ingest import LAB_LINE, StudyChunker
+
+
+def original_chunking(text: str) -> list:
+    lines = text.split("\n")
+    buffer, chunks = [], []
+
+    for line in lines:
+        buffer.append(line)
+
+        if LAB_LINE.search(line):
+            continue
+
+        if len(" ".join(buffer)) > 700:
+            chunks.append(" ".join(buffer))
+            buffer = []
+
+    if buffer:
+        chunks.append(" ".join(buffer))
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=800,
+        chunk_overlap=150
+    )
+
+    final_chunks = []
+    for chunk in chunks:
+        final_chunks.extend(splitter.split_text(chunk))
+
+    return final_chunks
+
+
+def make_page(n_lines: int, line_length: int, lab_every: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = ["cell", "membrane", "enzyme", "reaction", "energy", "theorem", "proof", "matrix"]
+    lines = []
+    for i in range(n_lines):
+        if lab_every and i % lab_every == 0:
+            lines.append(f"Glucose: {rng.randint(70, 140)} mg/dl")
+        else:
+            line = ""
+            while len(line) < line_length:
+                line += rng.choice(words) + " "
+            lines.append(line.strip())
+    return "\n".join(lines)
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=200, help="lines per page")
+    parser.add_argument("--line-length", type=int, default=1000)
+    parser.add_argument("--lab-every", type=int, default=10,
+                        help="every Nth line is a lab-style 'name: value unit' line (0 = none)")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = [make_page(args.lines, args.line_length, args.lab_every, seed=i) for i in range(args.pages)]
+    chars = sum(len(p) for p in pages)
+    print(f"{args.pages} pages x {args.lines} lines ({chars / 1e6:.2f} MB of text)\n")
+
+    old, old_s = timed(lambda: [c for p in pages for c in original_chunking(p)], args.repeat)
+
+    def per_page():
+        return [c for i, p in enumerate(pages)
+                for c, _ in StudyChunker().add_page(p, {"page": i, "ocr": False})]
+    new, new_s = timed(per_page, args.repeat)
+
+    def across():
+        chunker = StudyChunker(across_pages=True)
+        out = [c for i, p in enumerate(pages) for c, _ in chunker.add_page(p, {"page": i, "ocr": False})]
+        return out + [c for c, _ in chunker.finish()]
+    spans, across_s = timed(across, args.repeat)
+
+    print(f"{'chunker':<24} {'seconds':>9} {'MB/s':>8} {'chunks':>8}")
+    for name, result, seconds in (
+        ("original", old, old_s),
+        ("StudyChunker", new, new_s),
+        ("StudyChunker (across)", spans, across_s),
+    ):
+        print(f"{name:<24} {seconds:>9.3f} {chars / 1e6 / seconds:>8.2f} {len(result):>8}")
+    print(f"\nspeedup: {old_s / new_s:.1f}x, identical output: {old == new}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Speed vs accuracy report for the PDF extraction backends in
+app.rag.pdf_backends.
+
+Run from the backend directory:
+    python -m benchmarks.extract_bench                        # PDFs in app/rag and data/uploads
+    python -m benchmarks.extract_bench path/to/fixtures/ book.pdf
+    python -m benchmarks.extract_bench --backends pypdf,pymupdf --reference pypdf2
+
+For every backend: pages/sec over the fixture set, and the word-level
+similarity of its text to the reference backend's (1.0 = identical), per
+page and averaged weighted by length. OCR is not involved.
+"""
+import argparse
+import difflib
+import glob
+import os
+import re
+import time
+
+from app.rag.pdf_backends import available_backends, open_pdf
+
+
+DEFAULT_FIXTURES = ("app/rag", "data/uploads")
+
+
+def find_pdfs(paths) -> list:
+    pdfs = []
+    for path in paths:
+        if os.path.isdir(path):
+            pdfs.extend(sorted(glob.glob(os.path.join(path, "**", "*.pdf"), recursive=True)))
+        elif os.path.isfile(path):
+            pdfs.append(path)
+    return pdfs
+
+
+def extract(pdf_path: str, backend: str):
+    start = time.perf_counter()
+    doc = open_pdf(pdf_path, backend)
+    try:
+        pages = []
+        for page_num in range(doc.page_count):
+            try:
+                pages.append(doc.page_text(page_num))
+            except Exception as e:
+                pages.append("")
+                print(f"  ⚠️ {backend}: {os.path.basename(pdf_path)} page {page_num}: {e}")
+    finally:
+        doc.close()
+    return pages, time.perf_counter() - start
+
+
+def words(text: str) -> list:
+    return re.findall(r"\w+", text.lower())
+
+
+def similarity(pages, reference_pages):
+    """Length-weighted mean of per-page word sequence similarity."""
+    matched = total = 0
+    for text, ref in zip(pages, reference_pages):
+        a, b = words(text), words(ref)
+        weight = max(len(a), len(b))
+        if weight:
+            matched += difflib.SequenceMatcher(None, a, b, autojunk=False).ratio() * weight
+            total += weight
+    return matched / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="PDF files or directories (default: %s)" % ", ".join(DEFAULT_FIXTURES))
+    parser.add_argument("--backends", default=",".join(available_backends()))
+    parser.add_argument("--reference", default=None,
+                        help="backend treated as ground truth (default: pymupdf if installed, else pypdf2)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per file (best is kept)")
+    args = parser.parse_args()
+
+    pdfs = find_pdfs(args.paths or DEFAULT_FIXTURES)
+    if not pdfs:
+        parser.error("no PDFs found")
+    backends = [b for b in args.backends.split(",") if b]
+    reference = args.reference or ("pymupdf" if "pymupdf" in available_backends() else "pypdf2")
+    if reference not in backends:
+        backends.append(reference)
+
+    print(f"{len(pdfs)} PDFs, reference backend: {reference}\n")
+    texts, seconds = {}, {}
+    for backend in backends:
+        texts[backend], seconds[backend] = [], 0.0
+        for pdf in pdfs:
+            best = None
+            for _ in range(args.repeat):
+                pages, elapsed = extract(pdf, backend)
+                best = elapsed if best is None else min(best, elapsed)
+            texts[backend].append(pages)
+            seconds[backend] += best
+
+    n_pages = sum(len(pages) for pages in texts[reference])
+    print(f"{'backend':<10} {'pages/sec':>10} {'similarity':>11} {'chars':>10}")
+    for backend in backends:
+        sims = [similarity(p, r) for p, r in zip(texts[backend], texts[reference])]
+        weights = [len(p) for p in texts[reference]]
+        sim = sum(s * w for s, w in zip(sims, weights)) / max(1, sum(weights))
+        chars = sum(len(t) for pages in texts[backend] for t in pages)
+        print(f"{backend:<10} {n_pages / max(seconds[backend], 1e-9):>10.1f} {sim:>11.3f} {chars:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Recall vs latency vs memory report for the FAISS index kinds and vector
+codecs in app.rag.vector_store.
+
+Run from the backend directory:
+    python -m benchmarks.index_recall                     # synthetic corpus
+    python -m benchmarks.index_recall --index data/faiss/faculty/index.faiss
+
+--index takes the index_path of a store (manifest and segments, or a
+legacy single .faiss file); its live vectors form the corpus.
+    python -m benchmarks.index_recall --kinds flat --codecs float32,float16,int8,pq
+
+Exact float32 flat search is the ground truth. For each approximate kind
+the search-time knob (nprobe for IVF, efSearch for HNSW) is swept so a
+setting can be picked for FAISS_NPROBE / FAISS_EF_SEARCH.
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from app.rag.index_store import read_vectors
+from app.rag.vector_store import build_index, search_index
+
+
+def synthetic_corpus(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    # Clustered data behaves more like sentence embeddings than uniform noise
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 200), dim)).astype("float32")
+    vecs = centers[rng.integers(0, len(centers), n)] + 0.3 * rng.normal(size=(n, dim)).astype("float32")
+    faiss.normalize_L2(vecs)
+    return vecs
+
+
+def load_corpus(index_path: str) -> np.ndarray:
+    return np.ascontiguousarray(read_vectors(index_path), dtype="float32")
+
+
+def run(index, queries, k, truth, **knob):
+    ids, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        _, found = search_index(index, q[None, :], k, **knob)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(found[0])
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(ids, truth)])
+    return recall, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", help="existing index (index_path of a store) to take vectors from")
+    parser.add_argument("--n", type=int, default=200_000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--kinds", default="ivf,hnsw")
+    parser.add_argument("--codecs", default="float32")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.index) if args.index else synthetic_corpus(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    queries = corpus[rng.choice(len(corpus), args.queries, replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype("float32")
+    faiss.normalize_L2(queries)
+
+    flat = build_index(corpus, "flat")
+    truth = [search_index(flat, q[None, :], args.k)[1][0] for q in queries]
+
+    print(f"corpus={len(corpus)} dim={corpus.shape[1]} queries={len(queries)} k={args.k}")
+    print(f"{'kind':<8}{'codec':<9}{'knob':<14}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}{'MB':>10}")
+
+    def report(kind, codec, index, knob_label, **knob):
+        recall, p50, p95 = run(index, queries, args.k, truth, **knob)
+        mb = len(faiss.serialize_index(index)) / 1e6
+        print(f"{kind:<8}{codec:<9}{knob_label:<14}{recall:>10.3f}{p50:>10.3f}{p95:>10.3f}{mb:>10.1f}")
+
+    report("flat", "float32", flat, "-")
+    for kind in args.kinds.split(","):
+        for codec in args.codecs.split(","):
+            if (kind, codec) == ("flat", "float32"):
+                continue
+            start = time.perf_counter()
+            index = build_index(corpus, kind, codec)
+            print(f"# built {kind}/{codec} in {time.perf_counter() - start:.1f}s")
+            if kind == "ivf":
+                for nprobe in (1, 4, 8, 16, 32, 64):
+                    report(kind, codec, index, f"nprobe={nprobe}", nprobe=nprobe)
+            elif kind == "hnsw":
+                for ef in (16, 32, 64, 128, 256):
+                    report(kind, codec, index, f"efSearch={ef}", ef_search=ef)
+            else:
+                report(kind, codec, index, "-")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Re-encode existing FAISS indexes with a smaller vector codec.
+Run from the backend directory, e.g.:
+
+    python convert_faiss_indexes.py int8
+    python convert_faiss_indexes.py float16 data/faiss/faculty/index.faiss
+
+Each index is compacted into a single base segment encoded with the codec
+and published through its manifest; vector ids do not change, so the chunk
+stores stay valid. Re-encoding is lossy: converting int8 back to float32
+does not restore the original vectors. Set FAISS_VECTOR_CODEC to the same
+codec so new uploads keep using it.
+"""
+import sys
+
+from app.rag.vector_store import FAISS_BASE_PATH, CODECS
+from app.rag.index_store import list_stores, store_bytes, compact
+
+if len(sys.argv) < 2 or sys.argv[1] not in CODECS:
+    print(f"Usage: python convert_faiss_indexes.py {{{'|'.join(CODECS)}}} [index.faiss ...]")
+    sys.exit(1)
+
+codec = sys.argv[1]
+paths = sys.argv[2:] or list_stores(FAISS_BASE_PATH)
+
+total_before = total_after = 0
+for path in paths:
+    before = store_bytes(path)
+    compact(path, codec=codec)
+    after = store_bytes(path)
+    total_before += before
+    total_after += after
+    print(f"{path}: {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB")
+
+if total_after:
+    print(f"Total: {total_before / 1e6:.2f} MB -> {total_after / 1e6:.2f} MB "
+          f"({total_before / total_after:.1f}x smaller)")
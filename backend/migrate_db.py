@@ -101,4 +101,16 @@ print("Ensured timetables table exists")
 
 conn.commit()
 conn.close()
+
+# -------------------------------------------------------
+# 4. FAISS chunk metadata: pickled .meta lists -> SQLite chunk stores
+#    (also done lazily on first use; this migrates everything up front)
+# -------------------------------------------------------
+import glob
+from app.rag.chunk_store import ensure_chunk_store
+
+FAISS_DIR = os.path.join(os.path.dirname(__file__), "data", "faiss")
+for meta_path in glob.glob(os.path.join(FAISS_DIR, "**", "*.faiss.meta"), recursive=True):
+    ensure_chunk_store(meta_path[:-len(".meta")], meta_path)
+
 print("\n✅ Migration complete!")
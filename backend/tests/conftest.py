@@ -0,0 +1,24 @@
+"""
+Shared fixtures for the backend tests.
+
+Run from the backend directory (so `app` is importable):
+    python -m pytest tests -q
+"""
+import faiss
+import numpy as np
+import pytest
+
+DIM = 32
+
+
+def unit_vectors(seed: int, n: int, dim: int = DIM) -> np.ndarray:
+    """n reproducible L2-normalized float32 vectors (inner product = cosine)."""
+    vecs = np.random.default_rng(seed).normal(size=(n, dim)).astype("float32")
+    faiss.normalize_L2(vecs)
+    return vecs
+
+
+@pytest.fixture
+def vectors():
+    """unit_vectors(seed, n): the same seed always gives the same vectors."""
+    return unit_vectors
@@ -0,0 +1,74 @@
+"""
+Test for the semantic answer cache, with a fake LLM and fake embeddings.
+
+A repeated question is answered from the cache, but a faculty upload or
+delete bumps the faculty manifest version and must invalidate it, and a
+question that now retrieves a different set of chunks must not be served
+an answer generated from the old set.
+"""
+import numpy as np
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+DIM = 16
+QUESTION = "What are the conditions for deadlock?"
+
+
+def _near(seed: int, base: int = 0) -> np.ndarray:
+    """A unit vector close to axis `base` (cosine > 0.9)."""
+    vec = np.zeros((1, DIM), dtype="float32")
+    vec[0, base] = 1.0
+    vec += np.random.default_rng(seed).normal(scale=0.05, size=(1, DIM)).astype("float32")
+    return vec / np.linalg.norm(vec)
+
+
+def _upload(doc_id: int, vectors: np.ndarray):
+    from app.rag.index_store import append_vectors
+    from app.rag.pipeline import FACULTY_INDEX_PATH
+
+    append_vectors(FACULTY_INDEX_PATH, vectors, [
+        {"text": f"doc {doc_id} chunk {c}", "source": f"doc{doc_id}.pdf", "page": c,
+         "owner_type": "faculty", "doc_id": doc_id}
+        for c in range(len(vectors))
+    ])
+
+
+def test_answer_cache_follows_faculty_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)   # data/faiss is relative to the cwd
+
+    from app.rag import index_store, pipeline
+    from app.rag.answer_cache import SemanticAnswerCache
+
+    # Compaction would bump the version on its own, in the background
+    monkeypatch.setattr(index_store, "schedule_compaction", lambda index_path: None)
+    cache = SemanticAnswerCache()
+    monkeypatch.setattr(pipeline, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(pipeline, "embed_query_vector", lambda query: _near(0))
+    monkeypatch.setattr(pipeline, "_llm", GenericFakeChatModel(
+        messages=iter([AIMessage(content=f"answer {i}") for i in range(1, 10)])
+    ))
+
+    def ask():
+        return pipeline.rag_answer(QUESTION, "student-1", None)["answer"]
+
+    _upload(1, np.vstack([_near(seed) for seed in range(1, 4)]))
+    assert ask() == "answer 1"
+    assert ask() == "answer 1"                      # same chunks, same index version
+    assert cache.stats()["hits"] == 1
+
+    # An unrelated upload: the question retrieves the same chunks, but the
+    # new manifest version drops the cached answer
+    _upload(2, np.vstack([_near(seed, base=5) for seed in range(4, 6)]))
+    assert ask() == "answer 2"
+    assert cache.stats()["invalidated"] == 1
+    assert ask() == "answer 2"
+
+    # A relevant upload changes the chunks the question retrieves
+    _upload(3, np.vstack([_near(seed) for seed in range(6, 8)]))
+    assert ask() == "answer 3"
+    assert ask() == "answer 3"
+
+    # Deleting a document the answer was generated from
+    assert index_store.delete_vectors(pipeline.FACULTY_INDEX_PATH, doc_id=3) == 2
+    assert ask() == "answer 4"
+    assert cache.stats()["hits"] == 3
@@ -0,0 +1,62 @@
+"""
+Test for the streaming chat endpoint, with a fake streaming LLM.
+
+POST /chat/stream must send the session and sources before any answer
+token, stream the answer token by token, and persist the full answer.
+"""
+import json
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+ANSWER = "Mitosis has four phases: prophase, metaphase, anaphase and telophase."
+
+
+def _fake_llm(*replies):
+    # Streams each reply word by word, like ChatGroq streams tokens
+    return GenericFakeChatModel(messages=iter([AIMessage(content=r) for r in replies]))
+
+
+def test_chat_stream(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)   # chat.db and data/ are relative to the cwd
+
+    from fastapi.testclient import TestClient
+    from app import main
+    from app.db import crud
+    from app.db.database import SessionLocal
+    from app.rag import pipeline, study_llm
+
+    monkeypatch.setattr(study_llm, "_llm", _fake_llm(ANSWER))
+    monkeypatch.setattr(pipeline, "_llm", _fake_llm("Cell Division Phases"))   # title
+
+    client = TestClient(main.app)
+    with client.stream("POST", "/chat/stream", json={
+        "question": "What are the phases of mitosis?",
+        "user_id": "student-1",
+        "chat_mode": "general",
+    }) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in response.iter_lines() if line]
+
+    types = [e["type"] for e in events]
+    assert types[:2] == ["session", "sources"]
+    assert types[-2:] == ["done", "title"]
+    tokens = [e["text"] for e in events if e["type"] == "token"]
+    assert len(tokens) > 1                       # streamed, not one blob
+    assert set(types[2:-2]) == {"token"}
+    assert "".join(tokens).strip() == ANSWER
+    assert events[-2]["answer"] == ANSWER
+    assert events[-1]["title"] == "Cell Division Phases"
+    assert events[-1]["pending"] is False        # generated beside the answer
+
+    db = SessionLocal()
+    try:
+        session_id = events[0]["session_id"]
+        messages = crud.get_session_messages(db, session_id)
+        assert [(m.sender, m.content) for m in messages] == [
+            ("user", "What are the phases of mitosis?"),
+            ("ai", ANSWER),
+        ]
+    finally:
+        db.close()
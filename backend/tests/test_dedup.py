@@ -0,0 +1,41 @@
+"""Tests for ingest-time boilerplate and near-duplicate suppression."""
+from app.rag.dedup import BOILERPLATE_MIN_PAGES, IngestDeduper
+
+
+def _page(header, body, footer):
+    return "\n".join([header, body, footer])
+
+
+def test_repeated_header_and_page_numbers_are_stripped():
+    deduper = IngestDeduper()
+    kept = [
+        deduper.strip_boilerplate(
+            _page("CS101 Operating Systems", f"Unique body text of page {page}.", f"Page {page + 1} of 9"),
+            page,
+        )
+        for page in range(9)
+    ]
+
+    for page, text in enumerate(kept):
+        repeated = page >= BOILERPLATE_MIN_PAGES
+        assert ("CS101 Operating Systems" in text) != repeated
+        assert (f"Page {page + 1} of 9" in text) != repeated
+        assert f"Unique body text of page {page}." in text
+
+
+def test_numbered_content_lines_are_kept():
+    deduper = IngestDeduper()
+    steps = [f"Exercise {n}: trace the page table walk" for n in range(1, 7)]
+    for page, step in enumerate(steps):
+        text = deduper.strip_boilerplate(_page(step, "body", "Lab 2"), page)
+        assert step in text                 # differs only in its number: content
+        assert ("Lab 2" in text) == (page < BOILERPLATE_MIN_PAGES)   # exact repeat
+
+
+def test_near_duplicate_chunks_are_dropped():
+    deduper = IngestDeduper()
+    slide = "A deadlock needs mutual exclusion, hold and wait, no preemption and circular wait. " * 3
+    assert not deduper.is_duplicate(slide)
+    assert deduper.is_duplicate(slide + "Recap.")
+    assert not deduper.is_duplicate("Paging splits memory into fixed-size frames and pages. " * 3)
+    assert deduper.report()["chunks_dropped"] == 1
@@ -0,0 +1,204 @@
+"""
+Stress test for concurrent index writes.
+
+Several worker processes append vectors to the same index in parallel
+while reader threads keep searching it and background compaction runs.
+Every appended vector must be searchable afterwards.
+"""
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+UPLOADS_PER_WORKER = 12
+WORKERS = 4
+CHUNKS_PER_UPLOAD = 20
+
+
+def _upload_worker(index_path: str, worker: int, uploads: list):
+    # Compact often so merges race with appends from other processes
+    os.environ["FAISS_COMPACT_MAX_SEGMENTS"] = "3"
+    os.environ["FAISS_GC_GRACE_SECONDS"] = "1"
+    from app.rag.index_store import append_vectors
+
+    for upload, vecs in enumerate(uploads):
+        tag = f"w{worker}-u{upload}"
+        append_vectors(index_path, vecs, [
+            {"text": f"{tag}-c{c}", "source": tag, "page": c}
+            for c in range(CHUNKS_PER_UPLOAD)
+        ])
+
+
+def _hold_writer_lock(index_path: str, waiting, acquired):
+    from app.rag.index_store import writer_lock
+
+    waiting.set()
+    with writer_lock(index_path):
+        acquired.set()
+        time.sleep(3)
+
+
+def _uploads(vectors, worker: int) -> list:
+    return [vectors(worker * 1000 + upload, CHUNKS_PER_UPLOAD) for upload in range(UPLOADS_PER_WORKER)]
+
+
+def test_parallel_uploads_and_queries_lose_no_vectors(tmp_path, vectors):
+    from app.rag.index_store import read_manifest, search, compact
+    from app.rag.chunk_store import chunk_store_path, get_chunks
+
+    index_path = str(tmp_path / "index.faiss")
+    errors = []
+    stop = threading.Event()
+
+    def reader():
+        query = vectors(999_999, 1)
+        while not stop.is_set():
+            try:
+                hits = search(index_path, query, 5)
+                chunks = get_chunks(chunk_store_path(index_path), [i for _, i in hits])
+                # every hit from a published manifest has its chunk row
+                assert all(i in chunks for _, i in hits)
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=reader) for _ in range(3)]
+    for t in readers:
+        t.start()
+
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_upload_worker, args=(index_path, w, _uploads(vectors, w)))
+             for w in range(WORKERS)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=300)
+        assert p.exitcode == 0
+
+    stop.set()
+    for t in readers:
+        t.join()
+    assert not errors, errors[:3]
+
+    expected = WORKERS * UPLOADS_PER_WORKER * CHUNKS_PER_UPLOAD
+    manifest = compact(index_path)
+    assert manifest["next_id"] == expected
+    assert sum(s["count"] for s in manifest["segments"]) == expected
+    assert read_manifest(index_path)["next_id"] == expected
+
+    # Each uploaded vector is its own nearest neighbour, with the right text
+    store = chunk_store_path(index_path)
+    for worker in range(WORKERS):
+        for upload, vecs in enumerate(_uploads(vectors, worker)):
+            for c in (0, CHUNKS_PER_UPLOAD - 1):
+                score, vid = search(index_path, vecs[c:c + 1], 1)[0]
+                assert score > 0.999
+                assert get_chunks(store, [vid])[vid]["text"] == f"w{worker}-u{upload}-c{c}"
+
+
+def test_deleted_store_keeps_excluding_writers(tmp_path, vectors):
+    fcntl = pytest.importorskip("fcntl")
+    from app.rag.index_store import append_vectors, remove_store_files, writer_lock
+
+    index_path = str(tmp_path / "index.faiss")
+    append_vectors(index_path, vectors(0, 4), [{"text": f"c{c}"} for c in range(4)])
+
+    ctx = multiprocessing.get_context("spawn")
+    waiting, acquired = ctx.Event(), ctx.Event()
+    holder = ctx.Process(target=_hold_writer_lock, args=(index_path, waiting, acquired))
+    with writer_lock(index_path):
+        holder.start()
+        assert waiting.wait(60)
+        time.sleep(0.5)             # the holder is now blocked on the lock file
+        remove_store_files(index_path)
+    assert acquired.wait(10)
+
+    # A new writer must still wait for the holder
+    with open(index_path + ".lock", "a+b") as fh:
+        with pytest.raises(BlockingIOError):
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    holder.join(timeout=30)
+    assert holder.exitcode == 0
+
+
+def _superseded_store(index_path: str, vectors) -> set:
+    """A legacy base plus two appended segments, compacted into one base."""
+    import faiss
+    from app.rag.index_store import append_vectors, compact, segment_files
+
+    base = faiss.IndexFlatIP(8 * 4)
+    base.add(vectors(0, 4))
+    faiss.write_index(base, index_path)
+    for upload in (1, 2):
+        append_vectors(index_path, vectors(upload, 4), [{"text": f"u{upload}-c{c}"} for c in range(4)])
+    old = segment_files(index_path)
+    compact(index_path)
+    return old
+
+
+def test_garbage_collection_waits_for_the_grace_period(tmp_path, vectors):
+    from app.rag.index_store import collect_garbage, read_manifest
+
+    index_path = str(tmp_path / "index.faiss")
+    old = _superseded_store(index_path, vectors)
+    assert len(old) == 3 and os.path.normpath(index_path) in old
+
+    # Readers may still hold the previous manifest: nothing goes right away
+    assert collect_garbage(index_path) == 0
+    assert all(os.path.exists(path) for path in old)
+    assert len(read_manifest(index_path)["retired"]) == 3
+
+
+def test_garbage_collection_removes_superseded_segments(tmp_path, vectors):
+    from app.rag.index_store import collect_all_garbage, read_manifest, search, segment_files
+
+    index_path = str(tmp_path / "index.faiss")
+    old = _superseded_store(index_path, vectors)
+
+    assert collect_all_garbage(str(tmp_path), grace_seconds=0) == 3
+    assert not any(os.path.exists(path) for path in old)   # the legacy index.faiss too
+    assert "retired" not in read_manifest(index_path)
+    assert all(os.path.exists(path) for path in segment_files(index_path))
+    score, vid = search(index_path, vectors(2, 4)[3:], 1)[0]
+    assert score > 0.999 and vid == 11
+
+
+
+def test_deleted_vectors_leave_the_segment_files(tmp_path, vectors, monkeypatch):
+    import faiss
+    import numpy as np
+    from app.rag import index_store
+
+    monkeypatch.setattr(index_store, "schedule_compaction", index_store.compact)
+    index_path = str(tmp_path / "index.faiss")
+    for doc_id in (1, 2, 3):
+        index_store.append_vectors(index_path, vectors(doc_id, 4), [
+            {"text": f"d{doc_id}-c{c}", "doc_id": doc_id} for c in range(4)
+        ])
+    assert index_store.delete_vectors(index_path, doc_id=2) == 4   # compacts: a third is garbage
+    index_store.collect_garbage(index_path, grace_seconds=0)
+
+    seg_dir = index_store.segment_dir(index_path)
+    stored = [faiss.read_index(os.path.join(seg_dir, name))
+              for name in os.listdir(seg_dir) if name.endswith(".idx")]
+    stored = np.vstack([index.reconstruct_n(0, index.ntotal) for index in stored])
+    assert len(stored) == 8
+    assert (stored @ vectors(2, 4).T).max() < 0.999
+    assert (stored @ vectors(3, 4).T).max() > 0.999
+
+
+
+def test_read_vectors_skips_deleted_ones(tmp_path, vectors, monkeypatch):
+    import numpy as np
+    from app.rag import index_store
+
+    monkeypatch.setattr(index_store, "schedule_compaction", lambda index_path: None)
+    index_path = str(tmp_path / "index.faiss")
+    for doc_id in (1, 2, 3):
+        index_store.append_vectors(index_path, vectors(doc_id, 4), [
+            {"text": f"d{doc_id}-c{c}", "doc_id": doc_id} for c in range(4)
+        ])
+    index_store.delete_vectors(index_path, doc_id=2)
+
+    assert np.allclose(index_store.read_vectors(index_path), np.vstack([vectors(1, 4), vectors(3, 4)]))
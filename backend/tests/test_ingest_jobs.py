@@ -0,0 +1,164 @@
+"""
+Tests for background ingestion jobs.
+
+On startup, running jobs whose worker process is gone are requeued at
+once, and a retried job never attaches its upload twice.
+
+Deleted faculty documents are removed from the faculty index by
+tombstoning their chunk ids: searches must stop returning them at once,
+and compaction must be scheduled once enough of the index is dead.
+Chunks indexed before they carried a doc_id are only removed by file
+name when no other faculty document has that name.
+"""
+import os
+import socket
+
+import pytest
+
+UUID = "0" * 8 + "-0000-0000-0000-" + "0" * 12
+
+
+def test_remove_faculty_documents(tmp_path, monkeypatch, vectors):
+    from app import ingest_jobs
+    from app.rag import index_store
+    from app.rag.chunk_store import chunk_store_path, find_chunk_ids
+
+    index_path = str(tmp_path / "faculty.faiss")
+    chunks = {                      # (doc_id, source) -> ids
+        (1, "notes.pdf"): None,     # deleted, indexed with its doc_id
+        (None, "notes.pdf"): None,  # legacy chunks of a "notes.pdf" that stays
+        (None, "lab.pdf"): None,    # legacy chunks of the deleted "lab.pdf"
+        (3, "exam.pdf"): None,
+    }
+    for seed, (doc_id, source) in enumerate(chunks):
+        metas = [{"text": f"{source} {c}", "source": source, "page": c} for c in range(10)]
+        if doc_id is not None:
+            for meta in metas:
+                meta["doc_id"] = doc_id
+        chunks[doc_id, source] = index_store.append_vectors(index_path, vectors(seed, 10), metas)
+
+    compactions = []
+    monkeypatch.setattr(index_store, "schedule_compaction", compactions.append)
+    monkeypatch.setattr(ingest_jobs, "index_path_for", lambda owner_type, session_id: index_path)
+
+    class FakeSession:
+        def close(self):
+            pass
+
+    monkeypatch.setattr(ingest_jobs, "SessionLocal", FakeSession)
+    monkeypatch.setattr(ingest_jobs.crud, "get_faculty_file_paths", lambda db: [
+        f"uploads/{UUID}_notes.pdf",        # another upload named "notes.pdf"
+        f"uploads/{UUID}_exam.pdf",
+    ])
+
+    removed = ingest_jobs.remove_faculty_documents([
+        (1, f"uploads/{UUID}_notes.pdf"),
+        (2, f"uploads/{UUID}_lab.pdf"),
+        (4, f"uploads/{UUID}_notes.pdf"),   # deleted before it was indexed
+    ])
+
+    assert removed == 20
+    db_path = chunk_store_path(index_path)
+    assert find_chunk_ids(db_path, doc_id=None, source="notes.pdf") == list(chunks[None, "notes.pdf"])
+    assert find_chunk_ids(db_path, source="lab.pdf") == []
+
+    manifest = index_store.read_manifest(index_path)
+    assert index_store.garbage_ratio(manifest) == 0.5
+    assert set(compactions) == {index_path}
+
+    dead = set(chunks[1, "notes.pdf"]) | set(chunks[None, "lab.pdf"])
+    for seed, ids in enumerate(chunks.values()):
+        hits = index_store.search(index_path, vectors(seed, 10)[:1], 40)
+        assert not dead & {i for _, i in hits}
+        if not dead & set(ids):
+            assert hits[0][1] == ids[0]     # live chunks are still found
+
+
+
+@pytest.fixture
+def job_db(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app import ingest_jobs
+    from app.db import models
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(ingest_jobs, "SessionLocal", sessionmaker(bind=engine))
+    return ingest_jobs.SessionLocal
+
+
+def test_resume_requeues_jobs_of_dead_workers(job_db, monkeypatch):
+    from app import ingest_jobs
+    from app.db import crud
+
+    submitted = []
+
+    class Executor:
+        def submit(self, fn, job_id):
+            submitted.append(job_id)
+
+    monkeypatch.setattr(ingest_jobs, "_get_executor", Executor)
+    host = socket.gethostname()
+    db = job_db()
+    for job_id, worker_id in [("queued", None), ("restarted", f"{host}:{os.getpid()}:0000"),
+                              ("mine", ingest_jobs.WORKER_ID), ("sibling", f"{host}:{os.getppid()}:0000"),
+                              ("legacy", None), ("remote", "elsewhere:1:0000")]:
+        crud.create_ingest_job(db, job_id, owner_type="faculty", pdf_path=f"{job_id}.pdf",
+                               filename=f"{job_id}.pdf")
+        if job_id != "queued":
+            crud.claim_ingest_job(db, job_id, worker_id)
+    db.close()
+
+    # Interrupted only a moment ago, but their processes are gone
+    assert ingest_jobs.resume_ingest_jobs() == 3
+    assert submitted == ["queued", "restarted", "legacy"]
+    db = job_db()
+    assert crud.get_ingest_job(db, "restarted").status == "queued"
+    assert crud.get_ingest_job(db, "sibling").status == "running"
+    db.close()
+
+
+def test_retry_after_attaching_does_not_attach_again(job_db, monkeypatch):
+    from app import ingest_jobs
+    from app.db import crud
+
+    attached, lookups = [], []
+    monkeypatch.setattr(ingest_jobs, "ingest_document",
+                        lambda path, content_hash, progress: {"pages_done": 2, "pages_total": 2})
+    monkeypatch.setattr(ingest_jobs, "index_path_for", lambda owner_type, session_id: "faculty.faiss")
+    monkeypatch.setattr(ingest_jobs, "thaw", lambda index_path: None)
+    monkeypatch.setattr(ingest_jobs, "attach_document",
+                        lambda content_hash, index_path, **kw: attached.append(kw) or range(5))
+
+    def get_faculty_document_by_id(db, doc_id):
+        lookups.append(doc_id)
+        if len(lookups) == 1:
+            raise RuntimeError("database is locked")
+        return object()
+
+    monkeypatch.setattr(ingest_jobs.crud, "get_faculty_document_by_id", get_faculty_document_by_id)
+
+    class Timer:            # the retry is run by hand below
+        daemon = False
+
+        def start(self):
+            pass
+
+    monkeypatch.setattr(ingest_jobs.threading, "Timer", lambda *args: Timer())
+    db = job_db()
+    crud.create_ingest_job(db, "job", owner_type="faculty", pdf_path="notes.pdf",
+                           filename="notes.pdf", content_hash="ab" * 32, doc_id=7)
+    db.close()
+
+    ingest_jobs._run_job("job")       # fails after attaching; queued for a retry
+    db = job_db()
+    job = crud.get_ingest_job(db, "job")
+    assert (job.status, job.stage, job.chunks_done) == ("queued", "attached", 5)
+    db.close()
+
+    ingest_jobs._run_job("job")
+    assert len(attached) == 1 and lookups == [7, 7]
+    db = job_db()
+    assert crud.get_ingest_job(db, "job").status == "done"
+    db.close()
@@ -0,0 +1,156 @@
+"""
+Tests for the LLM gateway, against a local fake Groq server.
+
+The server speaks the OpenAI-style chat completions API that ChatGroq
+calls, answers after a short delay, can reply 429 + Retry-After to the
+first few requests, and records how many requests it had in flight.
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_groq import ChatGroq
+
+from app.rag.llm_gateway import GatedChatModel, LLMGateway, llm_request
+
+
+class FakeGroq(ThreadingHTTPServer):
+    def __init__(self, delay=0.1, rate_limit_first=0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.delay = delay
+        self.rate_limit_first = rate_limit_first
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests += 1
+            limited = server.requests <= server.rate_limit_first
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if limited:
+                self._reply(429, {"error": {"message": "Rate limit reached", "type": "tokens"}},
+                            headers=[("Retry-After", "0.2")])
+                return
+            time.sleep(server.delay)
+            self._reply(200, {
+                "id": "chatcmpl-test", "object": "chat.completion", "created": 0,
+                "model": request["model"],
+                "choices": [{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "echo: " + request["messages"][-1]["content"]},
+                }],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+def _serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _model(server, gateway):
+    llm = ChatGroq(api_key="test", model_name="llama-3.3-70b-versatile",
+                   groq_api_base=server.url, max_retries=0)
+    return GatedChatModel(llm=llm, gateway=gateway)
+
+
+def test_limits_in_flight_and_retries_rate_limits():
+    server = _serve(FakeGroq(delay=0.1, rate_limit_first=2))
+    gateway = LLMGateway(max_in_flight=2, max_retries=3)
+    model = _model(server, gateway)
+
+    async def ask(i):
+        with llm_request(f"student-{i}"):
+            return (await model.ainvoke(f"question {i}")).content
+
+    async def run():
+        return await asyncio.gather(*(ask(i) for i in range(6)))
+
+    try:
+        started = time.monotonic()
+        answers = asyncio.run(run())
+        elapsed = time.monotonic() - started
+    finally:
+        server.shutdown()
+
+    assert answers == [f"echo: question {i}" for i in range(6)]
+    assert server.max_in_flight <= 2
+    assert server.requests == 8                      # 6 answers + 2 rate limited
+    assert elapsed >= 0.2                            # waited out Retry-After
+    stats = gateway.stats()
+    assert stats["rate_limited"] == 2 and stats["retries"] == 2
+    assert stats["calls"] == 6 and stats["in_flight"] == 0
+    assert stats["queued"] == {"answer": 0, "title": 0}
+
+
+def test_gives_up_after_max_retries():
+    server = _serve(FakeGroq(rate_limit_first=100))
+    gateway = LLMGateway(max_in_flight=1, max_retries=1)
+    try:
+        _model(server, gateway).invoke("question")
+        raised = None
+    except Exception as e:
+        raised = e
+    finally:
+        server.shutdown()
+
+    assert getattr(raised, "status_code", None) == 429
+    assert server.requests == 2
+    assert gateway.stats()["in_flight"] == 0
+
+
+def test_answers_before_titles_and_users_round_robin():
+    gateway = LLMGateway(max_in_flight=1)
+    order = []
+
+    async def call(user_id, priority, name):
+        async with gateway.aslot(user_id, priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def run():
+        async with gateway.aslot("holder"):          # every call below has to queue
+            tasks = [asyncio.create_task(call("c", "title", "c-title"))]
+            tasks += [asyncio.create_task(call("a", "answer", f"a{i}")) for i in range(3)]
+            tasks.append(asyncio.create_task(call("b", "answer", "b0")))
+            await asyncio.sleep(0.05)
+            stats = gateway.stats()
+        await asyncio.gather(*tasks)
+        return stats
+
+    stats = asyncio.run(run())
+
+    assert stats["queued"] == {"answer": 4, "title": 1}
+    assert stats["queued_users"] == 3
+    assert order == ["a0", "b0", "a1", "a2", "c-title"]
+    assert gateway.stats()["in_flight"] == 0
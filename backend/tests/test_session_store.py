@@ -0,0 +1,76 @@
+"""
+Test for the periodic sweep of session indexes and shared document stores.
+
+Orphaned session indexes are deleted, idle ones frozen, and a shared
+document store (data/faiss/docs) is deleted once no faculty or session
+index, hot or cold, references it for longer than the grace period.
+"""
+import os
+import time
+
+
+def _shared_document(content_hash: str, vecs):
+    from app.rag.doc_store import doc_index_path
+    from app.rag.index_store import append_vectors, mark_shared
+
+    index_path = doc_index_path(content_hash)
+    append_vectors(index_path, vecs, [{"text": f"{content_hash[:4]}-{c}"} for c in range(len(vecs))])
+    mark_shared(index_path)
+
+
+def _sweep(session_ids=(), live_ids=(), idle_ids=()):
+    from app.rag.session_store import sweep_session_stores
+
+    result = sweep_session_stores(set(session_ids), set(live_ids), set(idle_ids))
+    # Age the marks past the grace period so the next sweep may delete
+    for name in os.listdir(os.path.join("data", "faiss", "docs")):
+        if name.endswith(".unreferenced"):
+            path = os.path.join("data", "faiss", "docs", name)
+            os.utime(path, (time.time() - 3600, time.time() - 3600))
+    return result
+
+
+def test_sweep_collects_unreferenced_documents(tmp_path, monkeypatch, vectors):
+    monkeypatch.chdir(tmp_path)   # data/faiss is relative to the cwd
+    from app.rag.doc_store import attach_document, is_ready
+    from app.rag.index_store import search
+    from app.rag.session_store import delete_session_store, is_cold, thaw
+    from app.rag.vector_store import index_path_for
+
+    kept, dropped, faculty = "a" * 64, "b" * 64, "c" * 64
+    for seed, content_hash in enumerate((kept, dropped, faculty)):
+        _shared_document(content_hash, vectors(seed, 5))
+
+    session_1, session_2 = index_path_for("student", 1), index_path_for("student", 2)
+    attach_document(kept, session_1, "kept.pdf", "student", session_id=1)
+    attach_document(kept, session_2, "kept.pdf", "student", session_id=2)
+    attach_document(dropped, session_1, "dropped.pdf", "student", session_id=1)
+    attach_document(faculty, index_path_for("faculty"), "faculty.pdf", "faculty")
+
+    # Session 1 is gone and session 2 idle: `dropped` loses its last reference,
+    # `kept` is still referenced from the cold archive of session 2
+    assert _sweep({1, 2}, live_ids={2}, idle_ids={2}) == {
+        "orphans_deleted": 1, "frozen": 1, "documents_deleted": 0   # marked only
+    }
+    assert is_cold(session_2)
+    assert _sweep()["documents_deleted"] == 1
+    assert not is_ready(dropped)
+    assert is_ready(kept) and is_ready(faculty)
+
+    # The thawed session still finds the shared vectors
+    thaw(session_2)
+    assert search(session_2, vectors(0, 1), 1)[0][0] > 0.999
+
+    # Referenced again before the grace period ran out: the mark is cleared
+    delete_session_store(2)
+    _sweep()
+    assert os.path.exists(f"data/faiss/docs/{kept}.faiss.unreferenced")
+    attach_document(kept, session_1, "kept.pdf", "student", session_id=1)
+    _sweep()
+    assert not os.path.exists(f"data/faiss/docs/{kept}.faiss.unreferenced")
+    assert is_ready(kept)
+
+    delete_session_store(1)
+    _sweep()
+    assert _sweep()["documents_deleted"] == 1
+    assert not is_ready(kept) and is_ready(faculty)
@@ -0,0 +1,140 @@
+"""
+Tests for streaming ingestion.
+
+PDF extraction and embeddings are replaced by synthetic pages and random
+vectors, so only the pipeline itself is exercised.
+"""
+import threading
+import time
+
+import faiss
+import numpy as np
+import pytest
+
+from app.rag import index_store, vector_store
+from app.rag.chunk_store import chunk_store_path, get_chunks
+
+DIM = 32
+PAGES = 40
+
+
+def _fake_pdf(monkeypatch):
+    def pages(pdf_path, start_page=0):
+        for page in range(start_page, PAGES):
+            time.sleep(0.01)   # slower than embedding: stage 2 waits on an empty queue
+            yield f"Page {page} covers topic {page} in detail. " * 40, {"page": page, "ocr": False}
+
+    def embed(chunks):
+        return np.random.default_rng(len(chunks)).normal(size=(len(chunks), DIM)).astype("float32")
+
+    monkeypatch.setattr(vector_store, "count_pdf_pages", lambda path: PAGES)
+    monkeypatch.setattr(vector_store, "iter_pdf_pages", pages)
+    monkeypatch.setattr(vector_store, "embed_documents_cached", embed)
+    monkeypatch.setattr(vector_store, "INGEST_EMBED_BATCH", 4)
+    monkeypatch.setattr(vector_store, "INGEST_COMMIT_CHUNKS", 8)
+    monkeypatch.setattr(vector_store, "INGEST_QUEUE_SIZE", 1)   # upstream stages block on put
+
+
+def _ingest_in_thread(index_path):
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = vector_store.ingest_and_store_pdf(
+                "notes.pdf", "faculty", None, index_path=index_path
+            )
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=20)
+    return thread, outcome
+
+
+def test_ingest_streams_all_pages(tmp_path, monkeypatch):
+    _fake_pdf(monkeypatch)
+    index_path = str(tmp_path / "index.faiss")
+
+    thread, outcome = _ingest_in_thread(index_path)
+
+    assert not thread.is_alive()
+    assert outcome["result"]["chunks_added"] > 0
+    assert index_store.read_manifest(index_path)["next_id"] == outcome["result"]["chunks_added"]
+
+
+def test_append_failure_stops_the_pipeline(tmp_path, monkeypatch):
+    _fake_pdf(monkeypatch)
+    appends = []
+
+    def failing_append(index_path, vectors, metadatas):
+        appends.append(len(metadatas))
+        raise OSError("disk full")
+
+    monkeypatch.setattr(index_store, "append_vectors", failing_append)
+
+    thread, outcome = _ingest_in_thread(str(tmp_path / "index.faiss"))
+
+    assert not thread.is_alive(), "ingestion hung after stage 3 failed"
+    assert isinstance(outcome.get("error"), OSError)
+    assert len(appends) == 1
+    assert not [t for t in threading.enumerate() if t.name.startswith("ingest-")]
+
+
+def _flowing_pages(pdf_path, start_page=0):
+    # Three ~150 char lines a page: CHUNK_ACROSS_PAGES blocks close mid-page
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    words = np.random.default_rng(0).choice(letters, size=(PAGES, 3, 22, 6))
+    for page in range(start_page, PAGES):
+        lines = [" ".join("".join(w) for w in words[page, i]) for i in range(3)]
+        yield "\n".join(lines), {"page": page, "ocr": False}
+
+
+def _chunk_texts(index_path):
+    size = index_store.read_manifest(index_path)["next_id"]
+    chunks = get_chunks(chunk_store_path(index_path), range(size))
+    return [chunks[i]["text"] for i in sorted(chunks)]
+
+
+def test_resume_across_pages_skips_committed_chunks(tmp_path, monkeypatch):
+    _fake_pdf(monkeypatch)
+    monkeypatch.setattr(vector_store, "iter_pdf_pages", _flowing_pages)
+    monkeypatch.setattr(vector_store, "CHUNK_ACROSS_PAGES", True)
+
+    full_path = str(tmp_path / "full.faiss")
+    vector_store.ingest_and_store_pdf("notes.pdf", "faculty", None, index_path=full_path)
+
+    resume_at = []
+
+    def interrupt(pages_done, pages_total, chunks_added, skip_chunks):
+        resume_at.append((pages_done, skip_chunks))
+        if len(resume_at) == 2:
+            raise KeyboardInterrupt
+
+    index_path = str(tmp_path / "index.faiss")
+    with pytest.raises(KeyboardInterrupt):
+        vector_store.ingest_and_store_pdf("notes.pdf", "faculty", None,
+                                          progress=interrupt, index_path=index_path)
+    start_page, skip_chunks = resume_at[-1]
+    assert skip_chunks > 0   # interrupted inside a block spanning pages
+    vector_store.ingest_and_store_pdf("notes.pdf", "faculty", None, start_page=start_page,
+                                      skip_chunks=skip_chunks, index_path=index_path)
+
+    assert _chunk_texts(index_path) == _chunk_texts(full_path)
+
+
+@pytest.mark.parametrize("kind,codec", [
+    (kind, codec) for kind in ("flat", "ivf", "hnsw") for codec in vector_store.CODECS
+    if (kind, codec) != ("hnsw", "pq")   # slow to train; HNSW storage is checked by the others
+])
+def test_index_kind_and_codec_round_trip(tmp_path, kind, codec):
+    # Fewer vectors than PQ/IVF would like: faiss only warns, and the
+    # structure of the index (what is checked here) is the same
+    vectors = np.random.default_rng(0).normal(size=(2000, DIM)).astype("float32")
+    index = vector_store.build_index(vectors, kind, codec)
+    assert (vector_store.index_kind(index), vector_store.index_codec(index)) == (kind, codec)
+
+    path = str(tmp_path / "index.faiss")
+    faiss.write_index(index, path)
+    loaded = faiss.read_index(path)
+    assert (vector_store.index_kind(loaded), vector_store.index_codec(loaded)) == (kind, codec)
@@ -4,18 +4,21 @@ import ChatInput from './ChatInput'
 import EmptyState from '../Common/EmptyState'
 import SourcePreviewModal from './SourcePreviewModal'
 import {
-  sendMessage,
+  streamMessage,
   getChatMessages
 } from '../../services/chatService'
 
 import './chat.css'
 
+const TITLE_REFRESH_MS = 5000
+
 const ChatBox = ({
   userId,
   activeSessionId,
   isNewChat,
   onSessionCreated,
-  onChatStarted
+  onChatStarted,
+  onTitleGenerated
 }) => {
   const [messages, setMessages] = useState([])
   const [isLoading, setIsLoading] = useState(false)
@@ -64,21 +67,10 @@ const ChatBox = ({
     return () => { cancelled = true }
   }, [activeSessionId])
 
-  const typeAIResponse = async (answer, messageId) => {
-    // Render 15 characters per frame at ~60fps — fast but still looks like streaming
-    const CHUNK = 15
-    const DELAY = 20
-    let i = 0
-    while (i < answer.length) {
-      i = Math.min(i + CHUNK, answer.length)
-      const current = answer.slice(0, i)
-      setMessages(prev =>
-        prev.map(msg =>
-          msg.id === messageId ? { ...msg, content: current } : msg
-        )
-      )
-      await new Promise(r => setTimeout(r, DELAY))
-    }
+  const updateMessage = (messageId, update) => {
+    setMessages(prev =>
+      prev.map(msg => (msg.id === messageId ? { ...msg, ...update(msg) } : msg))
+    )
   }
 
   // Called by ChatInput when a PDF is uploaded with no message typed.
@@ -130,31 +122,43 @@ const ChatBox = ({
     setMessages(prev => [...prev, userMessage])
 
     try {
-      const res = await sendMessage({
+      // The answer is streamed: sources arrive first, then the answer token by token
+      const aiMessageId = Date.now() + 1
+      await streamMessage({
         question,
         userId,
         sessionId: providedSessionId || activeSessionId,
-        chatMode
+        chatMode,
+        onEvent: (event) => {
+          if (event.type === 'session') {
+            if (!activeSessionId && event.session_id) {
+              onSessionCreated(event.session_id)
+            }
+          } else if (event.type === 'sources') {
+            setIsWaiting(false)
+            setMessages(prev => [...prev, {
+              id: aiMessageId,
+              sender: 'ai',
+              content: '',
+              sources: event.sources || [],
+              timestamp: new Date().toISOString()
+            }])
+          } else if (event.type === 'token') {
+            updateMessage(aiMessageId, msg => ({ content: msg.content + event.text }))
+          } else if (event.type === 'done') {
+            updateMessage(aiMessageId, () => ({ content: event.answer }))
+          } else if (event.type === 'title') {
+            onTitleGenerated?.(event.title)
+            if (event.pending) {
+              // Placeholder title: the generated one is saved shortly after
+              setTimeout(() => onTitleGenerated?.(), TITLE_REFRESH_MS)
+            }
+          } else if (event.type === 'error') {
+            throw new Error(event.detail)
+          }
+        }
       })
 
-      if (!activeSessionId && res.session_id) {
-        onSessionCreated(res.session_id)
-      }
-
-      setIsWaiting(false)
-
-      const aiMessageId = Date.now() + 1
-      const aiMessage = {
-        id: aiMessageId,
-        sender: 'ai',
-        content: '',
-        sources: res.sources || [],
-        timestamp: new Date().toISOString()
-      }
-
-      setMessages(prev => [...prev, aiMessage])
-      await typeAIResponse(res.answer, aiMessageId)
-
     } catch (error) {
       setIsWaiting(false)
       setMessages(prev => [
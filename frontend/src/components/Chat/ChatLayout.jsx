@@ -194,9 +194,10 @@ const ChatLayout = () => {
                     onSessionCreated={(newSessionId) => {
                         setActiveChatId(newSessionId)
                         setIsNewChat(false)
-                        // Remove placeholder + reload with real title from backend
+                        // Remove placeholder + reload (the generated title follows via onTitleGenerated)
                         loadChats()
                     }}
+                    onTitleGenerated={() => loadChats()}
                 />
 
             </div>
@@ -11,6 +11,39 @@ export const sendMessage = async ({ question, userId, sessionId, chatMode = 'rag
   return res.data
 }
 
+// Send message and stream the answer (NDJSON events from /chat/stream).
+// onEvent is called with each event: session, sources, token, done, title, error.
+export const streamMessage = async ({ question, userId, sessionId, chatMode = 'rag', onEvent }) => {
+  const res = await fetch(`${api.defaults.baseURL}/chat/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      question,
+      user_id: userId,
+      session_id: sessionId,
+      chat_mode: chatMode
+    })
+  })
+  if (!res.ok || !res.body) {
+    throw new Error(`Chat request failed (${res.status})`)
+  }
+
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const lines = buffer.split('\n')
+    buffer = lines.pop()
+    for (const line of lines) {
+      if (line.trim()) onEvent(JSON.parse(line))
+    }
+  }
+  if (buffer.trim()) onEvent(JSON.parse(buffer))
+}
+
 // Get all chat sessions
 export const getChatSessions = async (userId) => {
   const res = await api.get(`/chat/sessions/${userId}`)
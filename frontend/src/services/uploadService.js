@@ -1,5 +1,27 @@
 import api from "./api";
 
+/* Uploads are indexed in the background; poll the job until it finishes */
+const JOB_POLL_INTERVAL_MS = 1500
+
+export const waitForIngestJob = async (jobId) => {
+  for (;;) {
+    const { data } = await api.get(`/ingest/jobs/${jobId}`)
+    if (data.status === "done") return data
+    if (data.status === "failed") {
+      throw new Error(data.error || "Indexing failed")
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+  }
+}
+
+const uploadAndWait = async (url, formData) => {
+  const res = await api.post(url, formData, {
+    headers: { "Content-Type": "multipart/form-data" }
+  })
+  if (res.data?.job_id) await waitForIngestJob(res.data.job_id)
+  return res
+}
+
 /* Student PDF upload */
 export const uploadStudentPDF = async (file, userId, sessionId) => {
   console.log("uploadService: ", file, userId, sessionId)
@@ -12,9 +34,7 @@ export const uploadStudentPDF = async (file, userId, sessionId) => {
     formData.append("session_id", String(sessionId))
   }
 
-  return api.post("/upload/student", formData, {
-    headers: { "Content-Type": "multipart/form-data" }
-  })
+  return uploadAndWait("/upload/student", formData)
 }
 
 // export const uploadStudentPDF = async (file, userId, sessionId) => {
@@ -50,7 +70,5 @@ export const uploadFacultyPDF = async (file, metadata = {}) => {
   if (metadata.section) formData.append("section", metadata.section);
   if (metadata.path !== undefined) formData.append("path", metadata.path);
 
-  return api.post("/upload/faculty", formData, {
-    headers: { "Content-Type": "multipart/form-data" }
-  });
+  return uploadAndWait("/upload/faculty", formData);
 };